@@ -0,0 +1,40 @@
+import random
+import zlib
+from dataclasses import dataclass
+
+from config import (
+    AGENT_TIMEOUT_RATE,
+    AGENT_ERROR_RATE,
+    AGENT_TIMEOUT_SEC,
+    AGENT_MIN_LATENCY,
+    AGENT_MAX_LATENCY,
+    AGENT_DEAD_HOST_RATE,
+)
+
+SUCCESS = "success"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+
+@dataclass(frozen=True)
+class AgentModel:
+    """Latency and failure distribution of the simulated agent, AGENT_* settings by default."""
+
+    timeout_rate: float = AGENT_TIMEOUT_RATE
+    error_rate: float = AGENT_ERROR_RATE
+    timeout_sec: float = AGENT_TIMEOUT_SEC
+    min_latency: float = AGENT_MIN_LATENCY
+    max_latency: float = AGENT_MAX_LATENCY
+    dead_host_rate: float = AGENT_DEAD_HOST_RATE
+
+    def outcome(self, host_id: str, rng: random.Random = random) -> tuple[str, float]:
+        """Draws one call: the outcome ("success", "timeout" or "error") and how long it takes in seconds."""
+        # a stable share of the fleet never answers, like powered-off hosts
+        if zlib.crc32(host_id.encode("utf-8")) % 10_000 < self.dead_host_rate * 10_000:
+            return TIMEOUT, self.timeout_sec
+        p = rng.random()
+        if p < self.timeout_rate:
+            return TIMEOUT, self.timeout_sec
+        if p < self.timeout_rate + self.error_rate:
+            return ERROR, 0.0
+        return SUCCESS, rng.uniform(self.min_latency, self.max_latency)
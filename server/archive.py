@@ -0,0 +1,349 @@
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator
+from urllib.parse import urlsplit
+
+import orjson
+import zstandard
+from sqlalchemy import select
+from sqlalchemy.orm import Session as OrmSession
+
+from db.models import Job, Execution, ExecutionLogs, ExecutionLogChunk, Host
+import log_chunks
+
+from config import (
+    ARCHIVE_URL, ARCHIVE_S3_ENDPOINT_URL, ARCHIVE_ZSTD_LEVEL, ARCHIVE_READ_CACHE_BYTES, EXPORT_BATCH_SIZE,
+)
+
+# one zstd-compressed NDJSON file per table, rows as they were in Postgres
+JOB_FILE = "jobs.ndjson.zst"
+EXECUTIONS_FILE = "executions.ndjson.zst"
+LOGS_FILE = "execution_logs.ndjson.zst"
+# logs and output are a zstd frame per execution; their index maps execution_id to [offset, size, rows] of its frame
+LOGS_INDEX = "execution_logs.index.json"
+# agent output is unpacked from its blocks to one row per line, like the rest of the archive
+OUTPUT_FILE = "execution_output.ndjson.zst"
+OUTPUT_INDEX = "execution_output.index.json"
+JOB_FILES = (JOB_FILE, EXECUTIONS_FILE, LOGS_FILE, LOGS_INDEX, OUTPUT_FILE, OUTPUT_INDEX)
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = root
+
+    def url(self, name: str) -> str:
+        return f"file://{os.path.join(self.root, name)}"
+
+    def put(self, name: str, fileobj: BinaryIO) -> None:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # readers never see a half-written file
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+            raise
+
+    def get(self, name: str) -> bytes:
+        with open(os.path.join(self.root, name), "rb") as f:
+            return f.read()
+
+    def get_range(self, name: str, offset: int, size: int) -> bytes:
+        with open(os.path.join(self.root, name), "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def open(self, name: str) -> BinaryIO:
+        return open(os.path.join(self.root, name), "rb")
+
+    def delete(self, name: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(self.root, name))
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str):
+        import boto3  # only needed with an s3:// archive
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=ARCHIVE_S3_ENDPOINT_URL or None)
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def url(self, name: str) -> str:
+        return f"s3://{self.bucket}/{self._key(name)}"
+
+    def put(self, name: str, fileobj: BinaryIO) -> None:
+        self.client.upload_fileobj(fileobj, self.bucket, self._key(name))
+
+    def get(self, name: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(self.url(name)) from None
+
+    def get_range(self, name: str, offset: int, size: int) -> bytes:
+        try:
+            return self.client.get_object(
+                Bucket=self.bucket, Key=self._key(name), Range=f"bytes={offset}-{offset + size - 1}",
+            )["Body"].read()
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(self.url(name)) from None
+
+    def open(self, name: str) -> BinaryIO:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))["Body"]
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(self.url(name)) from None
+
+    def delete(self, name: str) -> None:
+        # a missing key is not an error for S3
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+
+@functools.lru_cache(maxsize=32)
+def storage(url: str) -> LocalStorage | S3Storage:
+    """Storage rooted at `url`: `file:///path` or `s3://bucket/prefix`."""
+    parts = urlsplit(url)
+    if parts.scheme == "file":
+        return LocalStorage(parts.path)
+    if parts.scheme == "s3":
+        return S3Storage(parts.netloc, parts.path)
+    raise ValueError(f"unsupported archive url: {url}")
+
+
+def job_prefix(job_id: uuid.UUID) -> str:
+    # two-character fan-out keeps local directories small
+    return f"jobs/{str(job_id)[:2]}/{job_id}/"
+
+
+@dataclass
+class ArchivedFile:
+    name: str
+    rows: int
+    bytes: int
+    sha256: str
+
+
+def _put(target: LocalStorage | S3Storage, name: str, tmp: BinaryIO, rows: int) -> ArchivedFile:
+    size = tmp.tell()
+    tmp.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: tmp.read(1 << 20), b""):
+        digest.update(chunk)
+    tmp.seek(0)
+    target.put(name, tmp)
+    return ArchivedFile(name, rows, size, digest.hexdigest())
+
+
+def _write(target: LocalStorage | S3Storage, name: str, partitions: Iterator[list]) -> ArchivedFile:
+    rows = 0
+    with tempfile.TemporaryFile() as tmp:
+        compressor = zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL)
+        with compressor.stream_writer(tmp, closefd=False) as writer:
+            for partition in partitions:
+                writer.write(b"".join(orjson.dumps(dict(row)) + b"\n" for row in partition))
+                rows += len(partition)
+        return _put(target, name, tmp, rows)
+
+
+def _write_framed(
+        target: LocalStorage | S3Storage, name: str, index_name: str, partitions: Iterator[list],
+) -> list[ArchivedFile]:
+    """Like _write for rows ordered by execution_id, but each execution's rows are a zstd frame of their own and
+    `index_name` locates the frames, so one execution is read with a ranged get. The file stays a valid .zst."""
+    compressor = zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL)
+    index: dict[str, list[int]] = {}
+    rows = 0
+    with tempfile.TemporaryFile() as tmp:
+        grouped = itertools.groupby(itertools.chain.from_iterable(partitions), key=lambda row: str(row["execution_id"]))
+        for execution_id, group in grouped:
+            lines = [orjson.dumps(dict(row)) + b"\n" for row in group]
+            frame = compressor.compress(b"".join(lines))
+            index[execution_id] = [tmp.tell(), len(frame), len(lines)]
+            tmp.write(frame)
+            rows += len(lines)
+        data_file = _put(target, name, tmp, rows)
+    with tempfile.TemporaryFile() as tmp:
+        tmp.write(orjson.dumps(index))
+        index_file = _put(target, index_name, tmp, len(index))
+    return [data_file, index_file]
+
+
+def _stream(session: OrmSession, stmt) -> Iterator[list]:
+    result = session.execute(stmt, execution_options={"stream_results": True, "yield_per": EXPORT_BATCH_SIZE})
+    return result.mappings().partitions()
+
+
+def _output_lines(partitions: Iterator[list]) -> Iterator[list[dict]]:
+    for partition in partitions:
+        yield [
+            {"execution_id": chunk["execution_id"], "line_no": chunk["first_line"] + i, "ts": chunk["ts"], "line": line}
+            for chunk in partition
+            for i, line in enumerate(log_chunks.decode(chunk["offsets"], chunk["data"]))
+        ]
+
+
+def write_job(session: OrmSession, job_id: uuid.UUID) -> tuple[str, list[ArchivedFile]]:
+    """Copies the job, its executions, their logs and output to the archive. Returns the job's location."""
+    root = storage(ARCHIVE_URL)
+    prefix = job_prefix(job_id)
+    executions = Execution.__table__
+    logs = ExecutionLogs.__table__
+    files = [
+        _write(root, prefix + JOB_FILE, _stream(session, select(Job.__table__).where(Job.uid == job_id))),
+        # hostname is kept: the host may be gone by the time somebody reads the archive
+        _write(root, prefix + EXECUTIONS_FILE, _stream(
+            session,
+            select(executions, Host.hostname)
+            .join(Host, Host.uid == executions.c.host_id)
+            .where(executions.c.job_id == job_id)
+            .order_by(Host.hostname.asc()),
+        )),
+        *_write_framed(root, prefix + LOGS_FILE, prefix + LOGS_INDEX, _stream(
+            session,
+            select(logs)
+            .join(executions, executions.c.uid == logs.c.execution_id)
+            .where(executions.c.job_id == job_id)
+            .order_by(logs.c.execution_id, logs.c.ts),
+        )),
+        *_write_framed(root, prefix + OUTPUT_FILE, prefix + OUTPUT_INDEX, _output_lines(_stream(
+            session,
+            select(ExecutionLogChunk.__table__)
+            .join(executions, executions.c.uid == ExecutionLogChunk.execution_id)
+            .where(executions.c.job_id == job_id)
+            .order_by(ExecutionLogChunk.execution_id, ExecutionLogChunk.first_line),
+        ))),
+    ]
+    return root.url(prefix), files
+
+
+def delete_job(job_id: uuid.UUID) -> None:
+    """Removes what write_job wrote for the job, e.g. after an attempt that failed halfway."""
+    root = storage(ARCHIVE_URL)
+    prefix = job_prefix(job_id)
+    for name in JOB_FILES:
+        root.delete(prefix + name)
+
+
+def write_manifest(jobs: list[dict]) -> str:
+    now = datetime.now(timezone.utc)
+    name = f"manifests/{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.json"
+    root = storage(ARCHIVE_URL)
+    content = orjson.dumps({"archived_at": now, "format": "ndjson+zstd", "jobs": jobs}, option=orjson.OPT_INDENT_2)
+    root.put(name, io.BytesIO(content))
+    return root.url(name)
+
+
+def _ndjson(data: bytes) -> tuple[tuple[dict, ...], int]:
+    text = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+    return tuple(orjson.loads(line) for line in text.splitlines() if line.strip()), len(text)
+
+
+def _json(data: bytes) -> tuple[dict, int]:
+    return orjson.loads(data), len(data)
+
+
+class _ParsedFiles:
+    """Parsed archive files by (location, name), least recently used dropped past `max_bytes` of their
+    uncompressed content. Archived files never change, so an entry never goes stale.
+
+    Only the small per-job files and indexes go here; per-execution rows are read by range and not kept.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._files: OrderedDict[tuple[str, str], tuple[object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, location: str, name: str, parse):
+        key = (location, name)
+        with self._lock:
+            if key in self._files:
+                self._files.move_to_end(key)
+                return self._files[key][0]
+        value, size = parse(storage(location).get(name))
+        with self._lock:
+            if key not in self._files and size <= self.max_bytes:
+                self._files[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, dropped) = self._files.popitem(last=False)
+                    self._bytes -= dropped
+        return value
+
+
+_parsed = _ParsedFiles(ARCHIVE_READ_CACHE_BYTES)
+
+
+def _read_frames(location: str, name: str, index_name: str, execution_id: str) -> Iterator[dict]:
+    try:
+        index = _parsed.get(location, index_name, _json)
+    except FileNotFoundError:
+        yield from _scan(location, name, execution_id)
+        return
+    entry = index.get(execution_id)
+    if entry is None:
+        return
+    offset, size, _ = entry
+    data = zstandard.ZstdDecompressor().decompress(storage(location).get_range(name, offset, size))
+    for line in data.splitlines():
+        if line.strip():
+            yield orjson.loads(line)
+
+
+def _scan(location: str, name: str, execution_id: str) -> Iterator[dict]:
+    # archived before the index: a single stream ordered by execution_id, decompressed as it is read
+    # and only the execution's own lines parsed
+    needle = b'"execution_id":"' + execution_id.encode() + b'"'
+    found = False
+    with contextlib.closing(storage(location).open(name)) as raw:
+        data = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        for line in io.BufferedReader(data):
+            if needle in line:
+                found = True
+                yield orjson.loads(line)
+            elif found:
+                return
+
+
+def read_job(location: str) -> dict:
+    return _parsed.get(location, JOB_FILE, _ndjson)[0]
+
+
+def read_executions(location: str) -> tuple[dict, ...]:
+    return _parsed.get(location, EXECUTIONS_FILE, _ndjson)
+
+
+def read_logs(location: str, execution_id: uuid.UUID) -> Iterator[dict]:
+    """The execution's event lines in order, read lazily."""
+    return _read_frames(location, LOGS_FILE, LOGS_INDEX, str(execution_id))
+
+
+def read_output(location: str, execution_id: uuid.UUID) -> Iterator[dict]:
+    """The agent output lines of the execution in order, read lazily."""
+    try:
+        yield from _read_frames(location, OUTPUT_FILE, OUTPUT_INDEX, str(execution_id))
+    except FileNotFoundError:
+        # archived before agent output was stored in blocks
+        return
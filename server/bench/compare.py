@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+
+
+def _flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    out: dict[str, float] = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out |= _flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = float(value)
+    return out
+
+
+# metrics where a higher value is an improvement; everything else (latencies) should go down
+HIGHER_IS_BETTER = ("per_sec",)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two load test results")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change treated as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        base = _flatten(json.load(f))
+    with open(args.candidate) as f:
+        cand = _flatten(json.load(f))
+
+    regressions = 0
+    for name in sorted(base.keys() & cand.keys()):
+        if name.startswith("params.") or not any(t in name for t in ("p50", "p95", "p99", "per_sec")):
+            continue
+        old, new = base[name], cand[name]
+        change = (new - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        mark = "REGRESSION" if worse > args.threshold else ""
+        regressions += bool(mark)
+        print(f"{name:55} {old:>12.4f} {new:>12.4f} {change:>+8.1%} {mark}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
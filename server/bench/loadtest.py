@@ -0,0 +1,260 @@
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.db import Session
+from db.models import Host, Job, Execution
+
+from config import REQUIRES_APPROVAL
+
+FINAL_STATUSES = (
+    Execution.Status.SUCCESS,
+    Execution.Status.FAILED,
+    Execution.Status.TIMEOUT,
+    Execution.Status.CANCELLED,
+    Execution.Status.BLOCKED,
+)
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pct(p: float) -> float:
+        idx = min(len(values) - 1, max(0, round(p * (len(values) - 1))))
+        return round(values[idx], 4)
+
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 4),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": round(values[-1], 4),
+    }
+
+
+def seed_hosts(count: int, batch_size: int = 5000) -> int:
+    with Session.begin() as session:
+        for start in range(0, count, batch_size):
+            rows = [{"hostname": f"host_{i}"} for i in range(start, min(count, start + batch_size))]
+            session.execute(pg_insert(Host).on_conflict_do_nothing(index_elements=["hostname"]), rows)
+        return session.execute(select(func.count(Host.uid))).scalar_one()
+
+
+def _post(url: str, body: dict | None = None) -> tuple[int, dict]:
+    data = json.dumps(body or {}).encode("utf-8")
+    req = urllib.request.Request(url, data=data, method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return resp.status, json.loads(resp.read() or b"{}")
+
+
+class LoadGenerator:
+    def __init__(self, api_url: str, run_id: str, hostnames: list[str], args):
+        self.api_url = api_url.rstrip("/")
+        self.run_id = run_id
+        self.hostnames = hostnames
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.webhook_latency: list[float] = []
+        self.approve_latency: list[float] = []
+        self.job_ids: list[str] = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _body(self, i: int) -> dict:
+        command_type = self.rng.choice(self.args.command_types)
+        if self.args.selector_size <= 0 or self.args.selector_size >= len(self.hostnames):
+            selector = {"all": True}
+        else:
+            selector = {"hostnames": self.rng.sample(self.hostnames, self.args.selector_size)}
+        if self.args.steps > 1:
+            commands = [self.rng.choice(self.args.command_types) for _ in range(self.args.steps)]
+            return {
+                "external_id": f"bench-{self.run_id}-{i}",
+                "selector": selector,
+                "steps": [{"command_type": command} for command in commands],
+            }
+        return {
+            "external_id": f"bench-{self.run_id}-{i}",
+            "command_type": command_type,
+            "selector": selector,
+            "payload": {},
+        }
+
+    def _fire(self, body: dict) -> None:
+        try:
+            t0 = time.perf_counter()
+            _, resp = _post(f"{self.api_url}/webhook/jobs/", body)
+            elapsed = time.perf_counter() - t0
+            job_id = str(resp["job_id"])
+
+            approve_elapsed = None
+            commands = [s["command_type"] for s in body["steps"]] if "steps" in body else [body["command_type"]]
+            if any(command in REQUIRES_APPROVAL for command in commands):
+                t0 = time.perf_counter()
+                _post(f"{self.api_url}/jobs/{job_id}/approve/")
+                approve_elapsed = time.perf_counter() - t0
+
+            with self._lock:
+                self.webhook_latency.append(elapsed)
+                self.job_ids.append(job_id)
+                if approve_elapsed is not None:
+                    self.approve_latency.append(approve_elapsed)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+
+    def run(self) -> float:
+        bodies = [self._body(i) for i in range(self.args.jobs)]
+        interval = 1.0 / self.args.rate if self.args.rate > 0 else 0.0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for i, body in enumerate(bodies):
+                due = started + i * interval
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._fire, body)
+        return time.perf_counter() - started
+
+
+def wait_for_completion(job_ids: list[str], timeout: float, poll: float = 1.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with Session() as session:
+            pending = session.execute(
+                select(func.count(Execution.uid)).where(
+                    Execution.job_id.in_(job_ids),
+                    Execution.status.not_in(FINAL_STATUSES),
+                )
+            ).scalar_one()
+        if pending == 0:
+            return True
+        time.sleep(poll)
+    return False
+
+
+def collect_db_metrics(job_ids: list[str]) -> dict:
+    with Session() as session:
+        job_rows = session.execute(
+            select(Job.plan_requested_at, Job.plan_published_at).where(
+                Job.uid.in_(job_ids),
+                Job.plan_published_at.is_not(None),
+            )
+        ).all()
+
+        rows = session.execute(
+            select(
+                Execution.status,
+                Execution.created_at,
+                Execution.dispatched_at,
+                Execution.lock_acquired_at,
+                Execution.agent_started_at,
+                Execution.agent_finished_at,
+                Execution.finished_at,
+                Execution.attempts,
+                Execution.step,
+                Job.steps,
+            ).join(Job, Job.uid == Execution.job_id).where(Execution.job_id.in_(job_ids))
+        ).all()
+
+    def seconds(end, start) -> list[float]:
+        return [(getattr(r, end) - getattr(r, start)).total_seconds()
+                for r in rows if getattr(r, end) is not None and getattr(r, start) is not None]
+
+    outbox_delay = [(published - requested).total_seconds() for requested, published in job_rows]
+
+    by_status: dict[str, int] = {}
+    for r in rows:
+        by_status[r.status.value] = by_status.get(r.status.value, 0) + 1
+
+    finished = [r.finished_at for r in rows if r.finished_at is not None]
+    span = (max(finished) - min(r.created_at for r in rows)).total_seconds() if finished else 0.0
+
+    return {
+        "executions_total": len(rows),
+        "executions_by_status": by_status,
+        "attempts": percentiles([float(r.attempts or 0) for r in rows]),
+        "outbox_to_plan_sec": percentiles(outbox_delay),
+        "queue_wait_sec": percentiles(seconds("lock_acquired_at", "dispatched_at")),
+        "agent_call_sec": percentiles(seconds("agent_finished_at", "agent_started_at")),
+        "execution_completion_sec": percentiles(seconds("finished_at", "created_at")),
+        "executions_per_sec": round(len(finished) / span, 2) if span > 0 else None,
+        # a SUCCESS execution must have run every step of its job's sequence (a plain job is a sequence of one)
+        "success_with_steps_left": sum(
+            1 for r in rows if r.status == Execution.Status.SUCCESS and r.step < len(r.steps or [None])
+        ),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load test for the webhook -> execution pipeline")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8081")
+    parser.add_argument("--hosts", type=int, default=10000, help="number of hosts to seed")
+    parser.add_argument("--jobs", type=int, default=100, help="number of webhooks to fire")
+    parser.add_argument("--rate", type=float, default=10.0, help="webhooks per second, 0 = as fast as possible")
+    parser.add_argument("--selector-size", type=int, default=100, help="hosts per job, 0 = all hosts")
+    parser.add_argument("--command-types", nargs="+", default=["PING"], choices=[c.value for c in Job.CommandType])
+    parser.add_argument("--steps", type=int, default=1, help="commands per job, >1 sends a sequence of --command-types")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for executions to finish")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write JSON results to this file")
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    total_hosts = seed_hosts(args.hosts)
+    with Session() as session:
+        hostnames = session.execute(select(Host.hostname).order_by(Host.hostname)).scalars().all()
+
+    gen = LoadGenerator(args.api_url, run_id, hostnames, args)
+    fire_sec = gen.run()
+    completed = wait_for_completion(gen.job_ids, args.timeout)
+
+    result = {
+        "run_id": run_id,
+        "commit": _git_commit(),
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "api_url")} | {"hosts_total": total_hosts},
+        "completed": completed,
+        "webhooks": {
+            "sent": len(gen.job_ids),
+            "errors": gen.errors,
+            "per_sec": round(len(gen.job_ids) / fire_sec, 2) if fire_sec > 0 else None,
+            "latency_sec": percentiles(gen.webhook_latency),
+            "approve_latency_sec": percentiles(gen.approve_latency),
+        },
+        "pipeline": collect_db_metrics(gen.job_ids) if gen.job_ids else {},
+    }
+
+    out = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+    if result["pipeline"].get("success_with_steps_left"):
+        raise SystemExit("SUCCESS executions that did not run every step of their sequence")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueListener
+
+from log import utils
+from log.conf import JsonFormatter, _LocalQueueHandler
+from log.utils import log_event, EventSampler
+
+logger = logging.getLogger("bench log_overhead")
+
+
+def _configure(mode: str, stream) -> QueueListener | None:
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.setLevel(logging.INFO)
+
+    h = logging.StreamHandler(stream)
+    h.setFormatter(JsonFormatter())
+    if mode == "sync":
+        root.addHandler(h)
+        return None
+
+    q = queue.SimpleQueue()
+    root.addHandler(_LocalQueueHandler(q))
+    listener = QueueListener(q, h)
+    listener.start()
+    return listener
+
+
+def _dispatch(executions: int, batch_size: int, per_execution: bool) -> None:
+    job_id = "00000000-0000-0000-0000-000000000000"
+    for start in range(0, executions, batch_size):
+        count = min(batch_size, executions - start)
+        if per_execution:
+            for i in range(count):
+                log_event(logger, 'send task_run_execution', job_id=job_id, execution_id=str(start + i))
+        else:
+            log_event(logger, 'send task_run_execution', job_id=job_id, count=count, duration_ms=1.0)
+
+
+def run(mode: str, executions: int, batch_size: int) -> dict:
+    with open(os.devnull, "w") as stream:
+        listener = _configure(mode, stream)
+        rates = {"send task_run_execution": 0.01} if mode == "queue_sampled" else {}
+        utils.sampler = EventSampler(rates, {})
+        per_execution = mode != "queue_batch_summary"
+
+        started = time.perf_counter()
+        _dispatch(executions, batch_size, per_execution)
+        caller_sec = time.perf_counter() - started
+
+        if listener is not None:
+            listener.stop()
+        total_sec = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "caller_ns_per_execution": round(caller_sec / executions * 1e9, 1),
+        "drained_ns_per_execution": round(total_sec / executions * 1e9, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Logging overhead per dispatched execution")
+    parser.add_argument("--executions", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    modes = ("sync", "queue", "queue_sampled", "queue_batch_summary")
+    result = {
+        "executions": args.executions,
+        "batch_size": args.batch_size,
+        "results": [run(mode, args.executions, args.batch_size) for mode in modes],
+    }
+
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
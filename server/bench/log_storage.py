@@ -0,0 +1,177 @@
+import argparse
+import json
+import random
+import time
+
+
+def _script_output(rng: random.Random, lines: int) -> list[str]:
+    # shaped like deploy/script output: repeating templates with varying paths, sizes and counters
+    templates = (
+        "{ts} INFO  copying /var/lib/app/releases/{rev}/lib/module_{n}.py ({size} bytes)",
+        "{ts} INFO  [{n}/{total}] unit test_{name}_{n} passed in {ms}ms",
+        "{ts} DEBUG resolved {name}=={major}.{minor}.{n} from cache",
+        "{ts} WARN  retrying GET https://mirror.internal/pkg/{name}-{major}.{minor}.tar.gz (attempt {attempt})",
+    )
+    names = ("requests", "urllib3", "celery", "kombu", "redis", "sqlalchemy", "alembic", "orjson")
+    rev = f"{rng.getrandbits(64):016x}"
+    return [
+        rng.choice(templates).format(
+            ts=f"2026-10-19T12:{(i // 60) % 60:02d}:{i % 60:02d}.{rng.randrange(1000):03d}Z",
+            rev=rev, n=i, total=lines, size=rng.randrange(200, 90_000), ms=rng.randrange(1, 900),
+            name=rng.choice(names), major=rng.randrange(1, 5), minor=rng.randrange(0, 30), attempt=rng.randrange(1, 4),
+        )
+        for i in range(lines)
+    ]
+
+
+def _sizes(table: str) -> dict:
+    from sqlalchemy import text
+    from db.db import engine
+
+    with engine.connect() as conn:
+        table_bytes, index_bytes = conn.execute(
+            text("SELECT pg_table_size(CAST(:t AS regclass)), pg_indexes_size(CAST(:t AS regclass))"), {"t": table}
+        ).one()
+    return {"table": table_bytes, "indexes": index_bytes}
+
+
+def _write_rows(execution_id, lines: list[str]) -> None:
+    from sqlalchemy import insert
+    from db.db import Session
+    from db.models import ExecutionLogs
+
+    with Session.begin() as session:
+        session.execute(insert(ExecutionLogs), [{"execution_id": execution_id, "line": line} for line in lines])
+
+
+def _write_chunks(execution_id, lines: list[str]) -> None:
+    from db.db import Session
+    import log_chunks
+
+    with Session.begin() as session:
+        log_chunks.append(session, execution_id, lines)
+
+
+def _tail_rows(execution_id, n: int) -> list:
+    from sqlalchemy import select
+    from db.db import Session
+    from db.models import ExecutionLogs
+
+    with Session() as session:
+        return session.execute(
+            select(ExecutionLogs.ts, ExecutionLogs.line)
+            .where(ExecutionLogs.execution_id == execution_id)
+            .order_by(ExecutionLogs.ts.desc())
+            .limit(n)
+        ).all()[::-1]
+
+
+def _tail_chunks(execution_id, n: int) -> list:
+    from db.db import Session
+    import log_chunks
+
+    with Session() as session:
+        return log_chunks.tail(session, execution_id, n)
+
+
+SCHEMAS = {
+    "rows": ("execution_logs", _write_rows, _tail_rows),
+    "chunks": ("execution_log_chunks", _write_chunks, _tail_chunks),
+}
+
+
+def run(schema: str, outputs: dict, append_lines: int, tail: int) -> dict:
+    table, write, read_tail = SCHEMAS[schema]
+    before = _sizes(table)
+
+    total_lines = sum(len(lines) for lines in outputs.values())
+    raw_bytes = sum(len(line.encode()) for lines in outputs.values() for line in lines)
+
+    # the agent streams output, so every execution is written in several appends
+    started = time.perf_counter()
+    for execution_id, lines in outputs.items():
+        for i in range(0, len(lines), append_lines):
+            write(execution_id, lines[i:i + append_lines])
+    write_sec = time.perf_counter() - started
+
+    after = _sizes(table)
+
+    started = time.perf_counter()
+    for execution_id in outputs:
+        assert len(read_tail(execution_id, tail)) == tail
+    tail_sec = time.perf_counter() - started
+
+    stored = (after["table"] - before["table"]) + (after["indexes"] - before["indexes"])
+    return {
+        "schema": schema,
+        "lines": total_lines,
+        "raw_mb": round(raw_bytes / 2 ** 20, 2),
+        "write_sec": round(write_sec, 3),
+        "lines_per_sec": round(total_lines / write_sec),
+        "table_mb": round((after["table"] - before["table"]) / 2 ** 20, 2),
+        "indexes_mb": round((after["indexes"] - before["indexes"]) / 2 ** 20, 2),
+        "bytes_per_line": round(stored / total_lines, 1),
+        f"tail_{tail}_ms": round(tail_sec / len(outputs) * 1000, 2),
+    }
+
+
+def _cleanup(execution_ids: list, since) -> None:
+    from sqlalchemy import delete
+    from db.db import Session
+    from db.models import ExecutionLogs, ExecutionLogChunk
+
+    with Session.begin() as session:
+        session.execute(delete(ExecutionLogs).where(
+            ExecutionLogs.execution_id.in_(execution_ids), ExecutionLogs.ts >= since))
+        session.execute(delete(ExecutionLogChunk).where(
+            ExecutionLogChunk.execution_id.in_(execution_ids), ExecutionLogChunk.ts >= since))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Storage and write throughput: one row per log line vs compressed blocks")
+    parser.add_argument("--executions", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=2000, help="output lines per execution")
+    parser.add_argument("--append-lines", type=int, default=200, help="lines per append (one transaction)")
+    parser.add_argument("--tail", type=int, default=100)
+    parser.add_argument("--schemas", nargs="+", default=list(SCHEMAS), choices=list(SCHEMAS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="do not delete the written lines afterwards")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    from datetime import datetime, timezone
+    from sqlalchemy import select
+    from db.db import Session
+    from db.models import Execution
+
+    with Session() as session:
+        execution_ids = session.execute(select(Execution.uid).limit(args.executions)).scalars().all()
+    if len(execution_ids) < args.executions:
+        raise SystemExit(f"need {args.executions} executions, found {len(execution_ids)}; run bench.loadtest first")
+
+    rng = random.Random(args.seed)
+    outputs = {execution_id: _script_output(rng, args.lines) for execution_id in execution_ids}
+
+    since = datetime.now(timezone.utc)
+    try:
+        results = [run(schema, outputs, args.append_lines, args.tail) for schema in args.schemas]
+    finally:
+        if not args.keep:
+            _cleanup(execution_ids, since)
+
+    result = {"executions": args.executions, "lines_per_execution": args.lines,
+              "append_lines": args.append_lines, "results": results}
+    if {"rows", "chunks"} <= set(args.schemas):
+        rows, chunks = results[args.schemas.index("rows")], results[args.schemas.index("chunks")]
+        result["storage_ratio"] = round(rows["bytes_per_line"] / chunks["bytes_per_line"], 1)
+        result["write_speedup"] = round(chunks["lines_per_sec"] / rows["lines_per_sec"], 1)
+
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
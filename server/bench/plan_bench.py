@@ -0,0 +1,149 @@
+import argparse
+import json
+import time
+import uuid
+
+HOST_PREFIX = "plan-bench-"
+
+
+def _setup_hosts(count: int) -> list[uuid.UUID]:
+    from sqlalchemy import select, insert
+    from db.db import Session
+    from db.models import Host, HostCommandBlock, Job
+
+    with Session.begin() as session:
+        existing = session.execute(
+            select(Host.uid).where(Host.hostname.like(f"{HOST_PREFIX}%")).order_by(Host.hostname)
+        ).scalars().all()
+        if len(existing) >= count:
+            return existing[:count]
+        rows = [{"uid": uuid.uuid4(), "hostname": f"{HOST_PREFIX}{i:07d}"} for i in range(len(existing), count)]
+        session.execute(insert(Host), rows)
+        # run_execution finishes these as BLOCKED right away, so the workers spend their time planning
+        session.execute(insert(HostCommandBlock), [
+            {"host_id": row["uid"], "command_type": Job.CommandType.RUN_SCRIPT} for row in rows
+        ])
+    return existing + [row["uid"] for row in rows]
+
+
+def _create_job(host_ids: list[uuid.UUID]) -> str:
+    from datetime import datetime, timezone
+    from sqlalchemy import insert
+    from db.db import Session
+    from db.models import Job, Execution
+
+    with Session.begin() as session:
+        job_id = session.execute(
+            insert(Job).values(
+                external_id=f"{HOST_PREFIX}{uuid.uuid4()}",
+                command_type=Job.CommandType.RUN_SCRIPT,
+                selector={"hostnames": []},
+                payload={},
+                plan_requested_at=datetime.now(timezone.utc),
+            ).returning(Job.uid)
+        ).scalar_one()
+        session.execute(insert(Execution), [{"job_id": job_id, "host_id": host_id} for host_id in host_ids])
+    return str(job_id)
+
+
+def _dispatched(job_id: str) -> int:
+    from sqlalchemy import select, func
+    from db.db import Session
+    from db.models import Execution
+
+    with Session() as session:
+        return session.execute(
+            select(func.count(Execution.uid))
+            .where(Execution.job_id == job_id, Execution.dispatched_at.is_not(None))
+        ).scalar_one()
+
+
+def _drain(job_id: str, timeout: float) -> None:
+    # the next job's plan_job message would otherwise queue behind this job's run_execution messages
+    from sqlalchemy import select, func
+    from db.db import Session
+    from db.models import Execution
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with Session() as session:
+            pending = session.execute(
+                select(func.count(Execution.uid))
+                .where(Execution.job_id == job_id, Execution.status.not_in(Execution.FINAL_STATUSES))
+            ).scalar_one()
+        if not pending:
+            return
+        time.sleep(1)
+
+
+def run(host_ids: list[uuid.UUID], shards: int, batch_size: int, timeout: float) -> dict:
+    from worker.celery_app import celery_app
+    from config import TASK_PLAN_JOB
+
+    job_id = _create_job(host_ids)
+    total = len(host_ids)
+
+    started = time.monotonic()
+    celery_app.send_task(TASK_PLAN_JOB, args=[job_id], kwargs={"batch_size": batch_size, "shards": shards})
+    first = None
+    dispatched = 0
+    while dispatched < total and time.monotonic() - started < timeout:
+        time.sleep(0.1)
+        dispatched = _dispatched(job_id)
+        if first is None and dispatched:
+            first = time.monotonic() - started
+    elapsed = time.monotonic() - started
+
+    return {
+        "job_id": job_id,
+        "shards": shards,
+        "executions": total,
+        "dispatched": dispatched,
+        "first_dispatch_sec": round(first, 3) if first is not None else None,
+        "full_dispatch_sec": round(elapsed, 3) if dispatched == total else None,
+        "dispatched_per_sec": round(dispatched / elapsed),
+    }
+
+
+def _cleanup(job_ids: list[str]) -> None:
+    from sqlalchemy import select, delete
+    from db.db import Session
+    from db.models import Job, Execution, ExecutionLogs
+
+    with Session.begin() as session:
+        session.execute(delete(ExecutionLogs).where(
+            ExecutionLogs.execution_id.in_(select(Execution.uid).where(Execution.job_id.in_(job_ids)))
+        ))
+        session.execute(delete(Job).where(Job.uid.in_(job_ids)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time to full dispatch of one large job: serial vs sharded planning")
+    parser.add_argument("--executions", type=int, default=50_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 8], help="1 is the serial planner")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=600)
+    # the bench hosts stay: deleting hosts cascades to executions by host_id, which is not indexed
+    parser.add_argument("--keep", action="store_true", help="keep the bench jobs")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    host_ids = _setup_hosts(args.executions)
+    results = []
+    try:
+        for shards in args.shards:
+            results.append(run(host_ids, shards, args.batch_size, args.timeout))
+            _drain(results[-1]["job_id"], args.timeout)
+    finally:
+        if not args.keep:
+            _cleanup([r["job_id"] for r in results])
+
+    out = json.dumps({"executions": args.executions, "batch_size": args.batch_size, "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
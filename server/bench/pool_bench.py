@@ -0,0 +1,134 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+# every child imports db.db after its environment is set, so each profile gets its own engine config
+PROFILES = {
+    "sqlalchemy_default": {"DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10", "DB_POOL_PRE_PING": "0"},
+    "worker_role": {"DB_ROLE": "worker"},
+    "pgbouncer_nullpool": {"DB_ROLE": "worker", "DB_PGBOUNCER": "1"},
+}
+
+
+def _worker(env: dict, duration: float, counter, ready, go) -> None:
+    os.environ.update(env)
+
+    from sqlalchemy import select, update, insert, text
+    from db.db import Session, lock_engine
+    from db.models import Execution, ExecutionLogs
+
+    with Session() as session:
+        ids = session.execute(select(Execution.uid).limit(50)).scalars().all()
+
+    ready.release()
+    go.wait()
+
+    done = 0
+    deadline = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < deadline:
+        execution_id = ids[i % len(ids)]
+        i += 1
+        # the transaction shape of one run_execution attempt
+        with Session.begin() as session:
+            session.execute(select(Execution).where(Execution.uid == execution_id)).scalars().one()
+        with lock_engine.connect() as conn:
+            conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": i})
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": i})
+            conn.commit()
+        with Session.begin() as session:
+            session.execute(
+                update(Execution).where(Execution.uid == execution_id).values(attempts=Execution.attempts)
+            )
+            session.execute(insert(ExecutionLogs).values(execution_id=execution_id, line="pool bench"))
+        done += 1
+
+    with counter.get_lock():
+        counter.value += done
+
+
+def _connections() -> int:
+    from sqlalchemy import text
+    from db.db import engine
+
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT count(*) FROM pg_stat_activity WHERE application_name = 'pool_bench'")
+        ).scalar_one()
+
+
+def run(profile: str, processes: int, duration: float, pgbouncer_url: str | None = None) -> dict:
+    ctx = mp.get_context("spawn")
+    counter = ctx.Value("i", 0)
+    ready = ctx.Semaphore(0)
+    go = ctx.Event()
+    # libpq picks the application name up from the environment, which lets us count only our connections
+    env = {"DB_POOL_PRE_PING": "1", "PGAPPNAME": "pool_bench"} | PROFILES[profile]
+    if env.get("DB_PGBOUNCER") == "1":
+        from config import POSTGRES_URL
+
+        # queries through PgBouncer, the host locks straight to Postgres as in production
+        env |= {"POSTGRES_URL": pgbouncer_url, "POSTGRES_DIRECT_URL": POSTGRES_URL}
+
+    _connections()  # import and connect up front so sampling starts with the run
+    procs = [ctx.Process(target=_worker, args=(env, duration, counter, ready, go)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+
+    go.set()
+    started = time.monotonic()
+    peak = 0
+    while any(p.is_alive() for p in procs):
+        peak = max(peak, _connections())
+        time.sleep(0.2)
+    elapsed = time.monotonic() - started
+    for p in procs:
+        p.join()
+
+    return {
+        "profile": profile,
+        "processes": processes,
+        "transactions_per_sec": round(counter.value / elapsed, 1),
+        "peak_connections": peak,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Connections used vs throughput for worker-shaped DB traffic")
+    parser.add_argument("--processes", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--pgbouncer-url", default=os.getenv("PGBOUNCER_URL"),
+                        help="transaction-mode PgBouncer in front of POSTGRES_URL, needed by pgbouncer_nullpool")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    if args.pgbouncer_url is None and "pgbouncer_nullpool" in args.profiles:
+        print("pgbouncer_nullpool skipped: no --pgbouncer-url", file=sys.stderr)
+        args.profiles.remove("pgbouncer_nullpool")
+
+    from sqlalchemy import select, delete
+    from db.db import Session
+    from db.models import Execution, ExecutionLogs
+
+    with Session() as session:
+        if session.execute(select(Execution.uid).limit(1)).first() is None:
+            raise SystemExit("no executions to work on, run bench.loadtest first")
+
+    result = {"results": [run(profile, args.processes, args.duration, args.pgbouncer_url) for profile in args.profiles]}
+
+    with Session.begin() as session:
+        session.execute(delete(ExecutionLogs).where(ExecutionLogs.line == "pool bench"))
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import itertools
+import json
+import time
+from collections import Counter
+
+# parameters that take several values; every combination is simulated
+SWEEP = ("workers", "max_retries", "base_backoff", "max_backoff", "plan_batch", "plan_shards", "retry_interval")
+
+
+def summarize(sim, wall_sec: float) -> dict:
+    from bench.loadtest import percentiles
+
+    finished = [e for e in sim.executions if e.finished_at is not None]
+    sim_sec = sim.clock.time()
+    return {
+        "completed": sim.pending == 0,
+        "sim_sec": round(sim_sec, 3),
+        "wall_sec": round(wall_sec, 3),
+        "speedup": round(sim_sec / wall_sec) if wall_sec else None,
+        "events": sim.clock.processed,
+        "statuses": dict(Counter(e.status.value for e in sim.executions)),
+        "retries": dict(sim.retries),
+        "attempts": percentiles([float(e.attempts) for e in sim.executions]),
+        "first_dispatch_sec": percentiles([j.first_dispatch_at - j.created_at for j in sim.jobs
+                                           if j.first_dispatch_at is not None]),
+        "full_dispatch_sec": percentiles([j.dispatched_at - j.created_at for j in sim.jobs
+                                          if j.dispatched_at is not None]),
+        "job_completion_sec": percentiles([j.finished_at - j.created_at for j in sim.jobs
+                                           if j.finished_at is not None]),
+        "execution_completion_sec": percentiles([e.finished_at - e.job.created_at for e in finished]),
+        "worker_utilization": round(sim.busy_sec / (sim.p.workers * sim_sec), 3) if sim_sec else 0.0,
+    }
+
+
+def main() -> None:
+    from agent import AgentModel
+    from sim.pipeline import Params, Simulation
+
+    defaults = Params()
+    model = defaults.agent
+    parser = argparse.ArgumentParser(description="Simulate the execution pipeline on a virtual clock")
+    parser.add_argument("--hosts", type=int, default=defaults.hosts)
+    parser.add_argument("--jobs", type=int, default=defaults.jobs)
+    parser.add_argument("--job-interval", type=float, default=defaults.job_interval)
+    parser.add_argument("--workers", type=int, nargs="+", default=[defaults.workers])
+    parser.add_argument("--max-retries", type=int, nargs="+", default=[defaults.max_retries])
+    parser.add_argument("--base-backoff", type=float, nargs="+", default=[defaults.base_backoff])
+    parser.add_argument("--max-backoff", type=float, nargs="+", default=[defaults.max_backoff])
+    parser.add_argument("--plan-batch", type=int, nargs="+", default=[defaults.plan_batch])
+    parser.add_argument("--plan-shards", type=int, nargs="+", default=[defaults.plan_shards])
+    parser.add_argument("--retry-interval", type=float, nargs="+", default=[defaults.retry_interval])
+    parser.add_argument("--task-sec", type=float, default=defaults.task_sec)
+    parser.add_argument("--batch-sec", type=float, default=defaults.batch_sec)
+    parser.add_argument("--publish-sec", type=float, default=defaults.publish_sec)
+    parser.add_argument("--timeout-rate", type=float, default=model.timeout_rate)
+    parser.add_argument("--error-rate", type=float, default=model.error_rate)
+    parser.add_argument("--timeout-sec", type=float, default=model.timeout_sec)
+    parser.add_argument("--latency", type=float, nargs=2, default=[model.min_latency, model.max_latency],
+                        metavar=("MIN", "MAX"))
+    parser.add_argument("--dead-rate", type=float, default=model.dead_host_rate)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of hosts with --slow-latency")
+    parser.add_argument("--slow-latency", type=float, nargs=2, default=[5.0, 20.0], metavar=("MIN", "MAX"))
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--limit-sec", type=float, default=7 * 24 * 3600, help="simulated seconds to give up after")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    agent = AgentModel(timeout_rate=args.timeout_rate, error_rate=args.error_rate, timeout_sec=args.timeout_sec,
+                       min_latency=args.latency[0], max_latency=args.latency[1], dead_host_rate=args.dead_rate)
+    slow_agent = AgentModel(timeout_rate=args.timeout_rate, error_rate=args.error_rate, timeout_sec=args.timeout_sec,
+                            min_latency=args.slow_latency[0], max_latency=args.slow_latency[1],
+                            dead_host_rate=args.dead_rate)
+    fixed = {
+        "hosts": args.hosts, "jobs": args.jobs, "job_interval": args.job_interval,
+        "task_sec": args.task_sec, "batch_sec": args.batch_sec, "publish_sec": args.publish_sec,
+        "slow_rate": args.slow_rate, "seed": args.seed,
+    }
+
+    results = []
+    for values in itertools.product(*(getattr(args, name) for name in SWEEP)):
+        swept = dict(zip(SWEEP, values))
+        params = Params(**fixed, **swept, agent=agent, slow_agent=slow_agent)
+        started = time.perf_counter()
+        sim = Simulation(params).run(limit=args.limit_sec)
+        results.append({"params": swept} | summarize(sim, time.perf_counter() - started))
+
+    out = json.dumps({"params": fixed | {"agent": vars(agent)}, "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
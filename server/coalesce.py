@@ -0,0 +1,56 @@
+import hashlib
+from dataclasses import dataclass
+
+import orjson
+
+from db.redis import redis_client
+
+from config import COALESCE_WINDOW_SEC, COALESCE_INFLIGHT_SEC
+
+HIT = "hit"
+WAIT = "wait"
+MISS = "miss"
+
+
+def key(host_id: str, command_type: str, payload: dict) -> str:
+    payload_hash = hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()[:32]
+    return f"coalesce:{host_id}:{command_type}:{payload_hash}"
+
+
+@dataclass
+class Lookup:
+    status: str
+    execution_id: str | None = None
+    result: dict | None = None
+
+
+def lookup(k: str, execution_id: str) -> Lookup:
+    """Finds a recent result or an in-flight call with the same (host, command, payload)."""
+    pipe = redis_client.pipeline()
+    pipe.get(k + ":result")
+    pipe.get(k + ":inflight")
+    result, inflight = pipe.execute()
+
+    if result is not None:
+        data = orjson.loads(result)
+        return Lookup(HIT, data["execution_id"], data["result"])
+    if inflight is not None and inflight.decode() != execution_id:
+        return Lookup(WAIT, inflight.decode())
+    return Lookup(MISS)
+
+
+def claim(k: str, execution_id: str) -> bool:
+    return bool(redis_client.set(k + ":inflight", execution_id, nx=True, ex=COALESCE_INFLIGHT_SEC))
+
+
+def publish(k: str, execution_id: str, result: dict) -> None:
+    pipe = redis_client.pipeline()
+    pipe.set(k + ":result", orjson.dumps({"execution_id": execution_id, "result": result}), ex=COALESCE_WINDOW_SEC)
+    pipe.delete(k + ":inflight")
+    pipe.execute()
+
+
+def release(k: str, execution_id: str) -> None:
+    # only the owner may drop the in-flight marker; followers then call the agent themselves
+    if redis_client.get(k + ":inflight") == execution_id.encode():
+        redis_client.delete(k + ":inflight")
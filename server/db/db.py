@@ -1,15 +1,137 @@
+import math
+import threading
+import time
 import uuid
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import NullPool
 
 from sqlalchemy.orm import Mapped, mapped_column
-from config import POSTGRES_URL
+from config import (
+    POSTGRES_URL, POSTGRES_DIRECT_URL, DB_PGBOUNCER,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS, DB_EXECUTEMANY_PAGE_SIZE,
+    POSTGRES_REPLICA_URL, REPLICA_MAX_LAG_SEC, REPLICA_CHECK_INTERVAL_SEC,
+)
 
 
 class Base(DeclarativeBase):
     uid: Mapped[uuid.UUID] = mapped_column(default=uuid.uuid4, primary_key=True)
 
 
-engine = create_engine(POSTGRES_URL)
+def _create_engine(url: str, pgbouncer: bool):
+    kwargs = dict(
+        pool_pre_ping=DB_POOL_PRE_PING,
+        # UPDATE/DELETE executemany go through psycopg2 execute_batch, INSERT through multi-row VALUES
+        executemany_mode="values_plus_batch",
+        insertmanyvalues_page_size=DB_EXECUTEMANY_PAGE_SIZE,
+        executemany_batch_page_size=DB_EXECUTEMANY_PAGE_SIZE,
+    )
+    if pgbouncer:
+        # PgBouncer already pools server connections, a client-side pool would only pin them
+        kwargs["poolclass"] = NullPool
+    else:
+        kwargs |= dict(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_use_lifo=True,
+        )
+        if DB_STATEMENT_TIMEOUT_MS:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+    eng = create_engine(url, **kwargs)
+
+    if pgbouncer and DB_STATEMENT_TIMEOUT_MS:
+        # startup options are rejected by PgBouncer, so the timeout is set per transaction
+        @event.listens_for(eng, "begin")
+        def _set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+    return eng
+
+
+engine = _create_engine(POSTGRES_URL, DB_PGBOUNCER)
 Session = sessionmaker(engine)
+
+# connections that hold session-level advisory locks; must not go through a transaction pooler, which
+# would hand the locking backend to other clients and lose the unlock without an error
+if DB_PGBOUNCER and POSTGRES_DIRECT_URL == POSTGRES_URL:
+    raise RuntimeError(
+        "DB_PGBOUNCER=1 requires POSTGRES_DIRECT_URL (Postgres or a session-mode pool) different from POSTGRES_URL"
+    )
+lock_engine = engine if POSTGRES_DIRECT_URL == POSTGRES_URL else _create_engine(POSTGRES_DIRECT_URL, False)
+
+read_engine = _create_engine(POSTGRES_REPLICA_URL, DB_PGBOUNCER) if POSTGRES_REPLICA_URL else None
+ReadSession = sessionmaker(read_engine) if read_engine is not None else Session
+
+
+def _lsn(value: str) -> int:
+    hi, lo = value.split("/")
+    return (int(hi, 16) << 32) + int(lo, 16)
+
+
+class _ReplicaState:
+    """Replay position and lag of the replica, measured at most once per REPLICA_CHECK_INTERVAL_SEC."""
+
+    # with nothing to replay the lag is 0, not the age of the last replayed transaction;
+    # without a running WAL receiver the replica is treated as infinitely behind
+    QUERY = text(
+        "SELECT pg_last_wal_replay_lsn()::text, "
+        "CASE WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN NULL "
+        "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_at = float("-inf")
+        self.replay_lsn = 0
+        self.lag = math.inf
+
+    def get(self) -> tuple[int, float]:
+        if time.monotonic() - self.checked_at >= REPLICA_CHECK_INTERVAL_SEC:
+            with self._lock:
+                if time.monotonic() - self.checked_at >= REPLICA_CHECK_INTERVAL_SEC:
+                    self._check()
+        return self.replay_lsn, self.lag
+
+    def _check(self) -> None:
+        try:
+            with read_engine.connect() as conn:
+                replay_lsn, lag = conn.execute(self.QUERY).one()
+            self.replay_lsn = _lsn(replay_lsn) if replay_lsn else 0
+            self.lag = float(lag) if lag is not None else math.inf
+        except Exception:
+            self.replay_lsn, self.lag = 0, math.inf
+        self.checked_at = time.monotonic()
+
+
+_replica = _ReplicaState()
+
+
+def read_session(min_lsn: str | None = None) -> sessionmaker:
+    """Sessionmaker for a read-only request: the replica unless it lags or has not replayed `min_lsn` yet."""
+    if read_engine is None:
+        return Session
+
+    replay_lsn, lag = _replica.get()
+    if lag > REPLICA_MAX_LAG_SEC:
+        return Session
+    if min_lsn:
+        try:
+            if replay_lsn < _lsn(min_lsn):
+                return Session
+        except ValueError:
+            return Session
+    return ReadSession
+
+
+def write_lsn() -> str | None:
+    """WAL position of the primary after a commit; clients send it back as X-Min-Lsn to read their own writes."""
+    if read_engine is None:
+        return None
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT pg_current_wal_insert_lsn()::text")).scalar_one()
@@ -5,7 +5,7 @@ from typing import Optional, Any
 from datetime import datetime, timezone
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, JSON, ForeignKey, DateTime, func, Text, Enum, Integer, UniqueConstraint
+from sqlalchemy import String, JSON, ForeignKey, DateTime, func, Text, Enum, Integer, UniqueConstraint, Float, Index, text, LargeBinary
 
 from .db import Base
 
@@ -42,18 +42,24 @@ class Job(Base):
         SUCCESS = "SUCCESS"
         FAILED = "FAILED"
         PARTIAL = "PARTIAL"
+        CANCELLED = "CANCELLED"
 
     external_id: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     signature: Mapped[str] = mapped_column(Text, nullable=True)
 
     selector: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False, default={})
     payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False, default={})
+    # a sequence: [{"command_type": ..., "payload": {...}}, ...] run in order on each host under one host lock;
+    # command_type is then the first step's
+    steps: Mapped[list[dict[str, Any]] | None] = mapped_column(JSON(none_as_null=True), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False,
                                                  default=lambda: datetime.now(timezone.utc))
 
     status: Mapped[Status] = mapped_column(Enum(Status, name='job_status'), nullable=False, default=Status.NEW)
     command_type: Mapped[CommandType] = mapped_column(Enum(CommandType, name='job_command_type'), nullable=False)
     approval_state: Mapped[ApprovalState] = mapped_column(Enum(ApprovalState, name='job_approval_state'), nullable=True)
+    plan_requested_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    plan_published_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     executions: Mapped[list["Execution"]] = relationship(back_populates="job", cascade="all, delete-orphan")
 
 
@@ -68,6 +74,17 @@ class HostCommandBlock(Base):
 
 class Execution(Base):
     __tablename__ = 'executions'
+    __table_args__ = (
+        # uid last: planners walk the NEW executions of a job (or of a uid range of it) in uid order
+        Index('ix_executions_job_id_status_uid', 'job_id', 'status', 'uid'),
+        Index('ix_executions_next_attempt_at', 'next_attempt_at',
+              postgresql_where=text("status = 'QUEUED' AND next_attempt_at IS NOT NULL")),
+        Index('ix_executions_lease_expires_at', 'lease_expires_at',
+              postgresql_where=text("status = 'RUNNING'")),
+        # queue_state.execution_counts on every scrape: only the unfinished executions, counted from the index
+        Index('ix_executions_status_next_attempt_at', 'status', 'next_attempt_at',
+              postgresql_where=text("status IN ('NEW', 'QUEUED', 'RUNNING')")),
+    )
 
     class Status(str, enum.Enum):
         NEW = "NEW"
@@ -79,6 +96,8 @@ class Execution(Base):
         TIMEOUT = "TIMEOUT"
         BLOCKED = "BLOCKED"
 
+    FINAL_STATUSES = (Status.SUCCESS, Status.FAILED, Status.CANCELLED, Status.TIMEOUT, Status.BLOCKED)
+
     job_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('jobs.uid', ondelete='CASCADE'), nullable=False)
     host_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('hosts.uid', ondelete='CASCADE'), nullable=False)
     status: Mapped[Status] = mapped_column(Enum(Status, name='executions_status'), default=Status.NEW, nullable=False)
@@ -89,6 +108,19 @@ class Execution(Base):
     finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     attempts: Mapped[int] = mapped_column(Integer, default=0)
 
+    queued_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    dispatched_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    lock_acquired_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    agent_started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    agent_finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    backoff_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0, server_default='0')
+
+    retries: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    # index of the step to run next; steps before it are done, so a retry resumes here
+    step: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
     job: Mapped["Job"] = relationship(back_populates="executions")
     host: Mapped["Host"] = relationship(back_populates="executions")
     logs: Mapped[list["ExecutionLogs"]] = relationship(
@@ -96,8 +128,41 @@ class Execution(Base):
     )
 
 
+class PlanShard(Base):
+    """A uid range of a large job's executions, claimed and dispatched by its own plan_shard task.
+
+    `last_uid` is the planner's cursor: everything up to it has been queued, so a shard taken over
+    after a crash continues from there.
+    """
+    __tablename__ = 'plan_shards'
+    __table_args__ = (UniqueConstraint('job_id', 'shard', name='plan_shards_job_id_shard'),)
+
+    class Status(str, enum.Enum):
+        NEW = "NEW"
+        RUNNING = "RUNNING"
+        DONE = "DONE"
+
+    job_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('jobs.uid', ondelete='CASCADE'), nullable=False)
+    shard: Mapped[int] = mapped_column(Integer, nullable=False)
+    # [uid_from, uid_to), NULL is unbounded
+    uid_from: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
+    uid_to: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
+    status: Mapped[Status] = mapped_column(Enum(Status, name='plan_shard_status'), nullable=False, default=Status.NEW)
+    last_uid: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
+    dispatched: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False,
+                                                 default=lambda: datetime.now(timezone.utc))
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
 class ExecutionLogs(Base):
     __tablename__ = 'execution_logs'
+    __table_args__ = (
+        Index('ix_execution_logs_execution_id_ts', 'execution_id', 'ts'),
+    )
 
     execution_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('executions.uid'), nullable=False)
 
@@ -106,6 +171,43 @@ class ExecutionLogs(Base):
     execution: Mapped["Execution"] = relationship(back_populates="logs")
 
 
+class ExecutionLogChunk(Base):
+    """Agent output of an execution, appended as zstd-compressed blocks of lines.
+
+    `offsets` holds the little-endian uint32 end offset of every line in the decompressed `data`,
+    so a range of lines is cut out without splitting the whole block.
+    """
+    __tablename__ = 'execution_log_chunks'
+    __table_args__ = (
+        UniqueConstraint('execution_id', 'first_line', name='execution_log_chunks_execution_id_first_line'),
+    )
+
+    execution_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('executions.uid', ondelete='CASCADE'), nullable=False)
+    first_line: Mapped[int] = mapped_column(Integer, nullable=False)
+    line_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    raw_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    offsets: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class ArchivedJob(Base):
+    """Where a job moved by archive_jobs lives now; uid is the id it had in `jobs`."""
+    __tablename__ = 'archived_jobs'
+
+    external_id: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    location: Mapped[str] = mapped_column(Text, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False,
+                                                  default=lambda: datetime.now(timezone.utc))
+
+
+class ArchivedExecution(Base):
+    """execution id -> archived job, for the logs endpoint."""
+    __tablename__ = 'archived_executions'
+
+    job_id: Mapped[uuid.UUID] = mapped_column(ForeignKey('archived_jobs.uid', ondelete='CASCADE'), nullable=False)
+
+
 class Outbox(Base):
     __tablename__ = 'outbox_event'
 
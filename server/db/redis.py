@@ -0,0 +1,5 @@
+import redis
+
+from config import REDIS_URL
+
+redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
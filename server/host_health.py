@@ -0,0 +1,148 @@
+import time
+from dataclasses import dataclass
+
+from db.redis import redis_client
+
+from config import (
+    CIRCUIT_CONSECUTIVE_FAILURES,
+    CIRCUIT_FAILURE_RATE,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_WINDOW_SEC,
+    CIRCUIT_OPEN_SEC,
+)
+
+# the rolling window is kept as a handful of per-bucket hashes, so old calls age out without a cleanup job
+BUCKET_SEC = max(1, CIRCUIT_WINDOW_SEC // 6)
+# a probe that never reports back (worker killed) must not keep the circuit half-open forever
+PROBE_TTL_SEC = 60
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def _key(host_id: str, name: str) -> str:
+    return f"host_health:{host_id}:{name}"
+
+
+def _buckets(host_id: str, now: float) -> list[str]:
+    current = int(now // BUCKET_SEC)
+    return [_key(host_id, f"b{b}") for b in range(current - CIRCUIT_WINDOW_SEC // BUCKET_SEC + 1, current + 1)]
+
+
+@dataclass
+class Admission:
+    allowed: bool
+    state: str
+    retry_after: float = 0.0
+    probe: bool = False
+
+
+def admit(host_id: str) -> Admission:
+    """Decides whether an execution may call the agent on this host.
+
+    While the circuit is open nothing goes through. Once the cool-down expires the circuit is
+    half-open and exactly one caller (the one that wins SET NX) probes the host.
+    """
+    pipe = redis_client.pipeline()
+    pipe.pttl(_key(host_id, "open"))
+    pipe.exists(_key(host_id, "tripped"))
+    open_ttl_ms, tripped = pipe.execute()
+
+    if open_ttl_ms > 0:
+        return Admission(False, OPEN, retry_after=open_ttl_ms / 1000)
+    if not tripped:
+        return Admission(True, CLOSED)
+    if redis_client.set(_key(host_id, "probe"), "1", nx=True, ex=PROBE_TTL_SEC):
+        return Admission(True, HALF_OPEN, probe=True)
+    return Admission(False, HALF_OPEN, retry_after=CIRCUIT_OPEN_SEC)
+
+
+def record(host_id: str, outcome: str) -> bool:
+    """Records one agent call ("success", "timeout" or "error"). Returns True if it (re)opened the circuit."""
+    now = time.time()
+    bucket = _buckets(host_id, now)[-1]
+
+    pipe = redis_client.pipeline()
+    pipe.hincrby(bucket, "calls", 1)
+    if outcome != "success":
+        pipe.hincrby(bucket, outcome + "s", 1)
+    pipe.expire(bucket, CIRCUIT_WINDOW_SEC + BUCKET_SEC)
+    if outcome == "success":
+        pipe.delete(_key(host_id, "consecutive"), _key(host_id, "tripped"), _key(host_id, "probe"))
+        pipe.execute()
+        return False
+
+    pipe.incr(_key(host_id, "consecutive"))
+    pipe.expire(_key(host_id, "consecutive"), CIRCUIT_WINDOW_SEC)
+    pipe.exists(_key(host_id, "tripped"))
+    *_, consecutive, _, tripped = pipe.execute()
+
+    window = _window(host_id, now)
+    calls, failures = window["calls"], window["failures"]
+    should_open = (
+        tripped  # a failed half-open probe
+        or consecutive >= CIRCUIT_CONSECUTIVE_FAILURES
+        or (calls >= CIRCUIT_MIN_CALLS and failures / calls >= CIRCUIT_FAILURE_RATE)
+    )
+    if not should_open:
+        return False
+
+    pipe = redis_client.pipeline()
+    pipe.set(_key(host_id, "open"), int(now), ex=CIRCUIT_OPEN_SEC)
+    pipe.set(_key(host_id, "tripped"), int(now), ex=CIRCUIT_WINDOW_SEC * 60)
+    pipe.delete(_key(host_id, "probe"))
+    pipe.execute()
+    return True
+
+
+def release_probe(host_id: str) -> None:
+    """Gives the probe slot back when the probing execution did not get to call the agent."""
+    redis_client.delete(_key(host_id, "probe"))
+
+
+def _window(host_id: str, now: float) -> dict:
+    pipe = redis_client.pipeline()
+    for bucket in _buckets(host_id, now):
+        pipe.hgetall(bucket)
+    totals = {"calls": 0, "timeouts": 0, "errors": 0}
+    for counts in pipe.execute():
+        for field, value in counts.items():
+            totals[field.decode()] = totals.get(field.decode(), 0) + int(value)
+    totals["failures"] = totals["timeouts"] + totals["errors"]
+    return totals
+
+
+def health(host_id: str) -> dict:
+    now = time.time()
+    window = _window(host_id, now)
+    calls = window["calls"]
+
+    pipe = redis_client.pipeline()
+    pipe.pttl(_key(host_id, "open"))
+    pipe.exists(_key(host_id, "tripped"))
+    pipe.get(_key(host_id, "consecutive"))
+    open_ttl_ms, tripped, consecutive = pipe.execute()
+
+    if open_ttl_ms > 0:
+        state = OPEN
+    elif tripped:
+        state = HALF_OPEN
+    else:
+        state = CLOSED
+
+    failure_rate = window["failures"] / calls if calls else 0.0
+    return {
+        "host_id": host_id,
+        "state": state,
+        "retry_after_sec": round(open_ttl_ms / 1000, 1) if open_ttl_ms > 0 else 0,
+        "window_sec": CIRCUIT_WINDOW_SEC,
+        "calls": calls,
+        "timeouts": window["timeouts"],
+        "errors": window["errors"],
+        "failure_rate": round(failure_rate, 3),
+        "timeout_rate": round(window["timeouts"] / calls, 3) if calls else 0.0,
+        "consecutive_failures": int(consecutive or 0),
+        # 1.0 is a healthy host, 0.0 one that fails every call
+        "score": round(1.0 - failure_rate, 3),
+    }
@@ -0,0 +1,95 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from redis import RedisError, WatchError
+
+from db.redis import redis_client
+from log.utils import log_event
+
+from config import JOB_VERSION_TTL_SEC, JOB_RESPONSE_CACHE_SEC
+
+logger = logging.getLogger('job_cache')
+
+
+def _version_key(job_id: str) -> str:
+    return f"job_version:{job_id}"
+
+
+def _response_key(job_id: str, version: int, name: str) -> str:
+    return f"job_response:{job_id}:{version}:{name}"
+
+
+@dataclass
+class JobVersion:
+    version: int
+    changed_at: float
+    final: bool
+
+    def etag(self, job_id: str) -> str:
+        return f'"{job_id}-{self.version}"'
+
+
+def bump(*job_ids: str) -> None:
+    """Marks jobs as changed; called after the transaction that changed their executions commits."""
+    if not job_ids:
+        return
+    now = time.time()
+    pipe = redis_client.pipeline()
+    for job_id in job_ids:
+        key = _version_key(str(job_id))
+        # an expired or lost key is seeded like in get(), so the count never restarts at a value an old ETag had
+        pipe.hsetnx(key, "v", time.time_ns() // 1000)
+        pipe.hincrby(key, "v", 1)
+        pipe.hset(key, "ts", now)
+        pipe.hdel(key, "final")
+        pipe.expire(key, JOB_VERSION_TTL_SEC)
+    try:
+        pipe.execute()
+    except RedisError as e:
+        # the version TTL bounds how long clients may keep getting 304 for the missed change
+        log_event(logger, 'job version bump failed', count=len(job_ids), error_type=type(e).__name__, error_msg=str(e))
+
+
+def get(job_id: str) -> JobVersion:
+    key = _version_key(job_id)
+    data = redis_client.hgetall(key)
+    if b"v" not in data:
+        # unknown or expired: start from a time-based value so ETags issued before a Redis restart
+        # or an expiry never match again
+        now = time.time()
+        pipe = redis_client.pipeline()
+        pipe.hsetnx(key, "v", time.time_ns() // 1000)
+        pipe.hsetnx(key, "ts", now)
+        pipe.expire(key, JOB_VERSION_TTL_SEC)
+        pipe.hgetall(key)
+        data = pipe.execute()[-1]
+    return JobVersion(int(data[b"v"]), float(data[b"ts"]), data.get(b"final") == b"1")
+
+
+def discard(job_id: str) -> None:
+    # get() seeds a version for any id it is asked about; ids that turn out not to exist do not keep one
+    redis_client.delete(_version_key(job_id))
+
+
+def mark_final(job_id: str, version: int) -> None:
+    # only if nothing changed since the response was built
+    key = _version_key(job_id)
+    with redis_client.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            if int(pipe.hget(key, "v") or 0) != version:
+                return
+            pipe.multi()
+            pipe.hset(key, "final", 1)
+            pipe.execute()
+        except WatchError:
+            pass
+
+
+def get_response(job_id: str, version: int, name: str) -> bytes | None:
+    return redis_client.get(_response_key(job_id, version, name))
+
+
+def put_response(job_id: str, version: int, name: str, content: bytes) -> None:
+    redis_client.set(_response_key(job_id, version, name), content, ex=JOB_RESPONSE_CACHE_SEC)
@@ -0,0 +1,34 @@
+import logging
+
+from redis import RedisError
+
+from db.redis import redis_client
+from log.utils import log_event
+
+from config import JOB_CANCEL_FLAG_TTL_SEC
+
+logger = logging.getLogger('job_cancel')
+
+
+class JobCancelled(Exception):
+    """Raised in a worker when the job of the execution it is running has been cancelled."""
+
+
+def _key(job_id: str) -> str:
+    return f"job_cancelled:{job_id}"
+
+
+def mark(job_id: str) -> None:
+    """Raises the flag workers check; the job and its queued executions are already cancelled in Postgres."""
+    try:
+        redis_client.set(_key(job_id), 1, ex=JOB_CANCEL_FLAG_TTL_SEC)
+    except RedisError as e:
+        # queued executions are cancelled anyway, only calls already in flight run to their end
+        log_event(logger, 'job cancel flag failed', job_id=job_id, error_type=type(e).__name__, error_msg=str(e))
+
+
+def is_cancelled(job_id: str) -> bool:
+    try:
+        return bool(redis_client.exists(_key(job_id)))
+    except RedisError:
+        return False
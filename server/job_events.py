@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import orjson
+import redis.asyncio
+from redis import RedisError
+
+from db.redis import redis_client
+from log.utils import log_event
+
+from config import (
+    REDIS_URL,
+    JOB_EVENTS_MAX_PENDING,
+    JOB_EVENTS_MAX_LOG_LINES,
+)
+
+logger = logging.getLogger('job_events')
+
+CHANNEL_PREFIX = "job_events:"
+
+
+def _channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+def _event(execution_id: str, status: str, line: str | None) -> dict:
+    event = {"execution_id": execution_id, "status": status, "ts": time.time()}
+    if line is not None:
+        event["line"] = line
+    return event
+
+
+def publish(job_id: str, execution_id: str, status: str, line: str | None = None) -> None:
+    """Announces an execution status change (and its log line) to the watchers of the job."""
+    publish_many(job_id, [execution_id], status, line)
+
+
+def publish_many(job_id: str, execution_ids: list[str], status: str, line: str | None = None) -> None:
+    if not execution_ids:
+        return
+    channel = _channel(str(job_id))
+    pipe = redis_client.pipeline(transaction=False)
+    for execution_id in execution_ids:
+        pipe.publish(channel, orjson.dumps(_event(str(execution_id), status, line)))
+    try:
+        pipe.execute()
+    except RedisError as e:
+        # watchers miss the update, polling clients are unaffected
+        log_event(logger, 'job event publish failed', job_id=str(job_id), count=len(execution_ids),
+                  error_type=type(e).__name__, error_msg=str(e))
+
+
+def sse(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+RESYNC = sse("resync", {})
+
+
+class Watcher:
+    """Pending events of one connection, as ready-to-send SSE frames.
+
+    Status changes are coalesced per execution (only the latest one is kept) and log lines go to a
+    bounded buffer, so a slow client costs memory proportional to the job, not to the event rate.
+    If even that overflows, everything is dropped and the client is told to resync.
+    """
+
+    def __init__(self):
+        self.statuses: dict[str, bytes] = {}
+        self.lines: deque[bytes] = deque(maxlen=JOB_EVENTS_MAX_LOG_LINES)
+        self.dropped_lines = 0
+        self.overflow = False
+        self.ready = asyncio.Event()
+
+    def push(self, execution_id: str, status_frame: bytes, line_frame: bytes | None) -> None:
+        if not self.overflow:
+            self.statuses[execution_id] = status_frame
+            if len(self.statuses) > JOB_EVENTS_MAX_PENDING:
+                self.overflow = True
+                self.statuses.clear()
+                self.lines.clear()
+        if line_frame is not None and not self.overflow:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped_lines += 1
+            self.lines.append(line_frame)
+        self.ready.set()
+
+    def drain(self) -> bytes:
+        if self.overflow:
+            out = RESYNC
+        else:
+            out = b"".join(self.statuses.values()) + b"".join(self.lines)
+            if self.dropped_lines:
+                out += sse("dropped", {"log_lines": self.dropped_lines})
+        self.statuses = {}
+        self.lines.clear()
+        self.dropped_lines = 0
+        self.overflow = False
+        self.ready.clear()
+        return out
+
+
+class JobEventsHub:
+    """One Redis pub/sub connection per API process, fanned out to every watcher in it."""
+
+    def __init__(self):
+        self._watchers: dict[str, set[Watcher]] = {}
+        # the channel subscription of each watched job, shared by the watchers that arrive while it is in flight
+        self._subscriptions: dict[str, asyncio.Future] = {}
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+
+    async def watch(self, job_id: str) -> Watcher:
+        watcher = Watcher()
+        self._watchers.setdefault(job_id, set()).add(watcher)
+        subscription = self._subscriptions.get(job_id)
+        if subscription is None:
+            subscription = self._subscriptions[job_id] = asyncio.ensure_future(self._subscribe(job_id))
+        try:
+            # shielded: a client that goes away does not cancel the subscription of the others
+            await asyncio.shield(subscription)
+        except BaseException:
+            # nobody will stream this watcher, so nobody else would unwatch it
+            self.unwatch(job_id, watcher)
+            raise
+        return watcher
+
+    async def _subscribe(self, job_id: str) -> None:
+        if self._pubsub is None:
+            self._pubsub = redis.asyncio.Redis.from_url(REDIS_URL).pubsub()
+        await self._pubsub.subscribe(_channel(job_id))
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    def unwatch(self, job_id: str, watcher: Watcher) -> None:
+        # synchronous: it runs from the stream's finally block, which is already cancelled on disconnect
+        watchers = self._watchers.get(job_id)
+        if watchers is None:
+            return
+        watchers.discard(watcher)
+        if not watchers:
+            del self._watchers[job_id]
+            self._subscriptions.pop(job_id, None)
+            asyncio.get_running_loop().create_task(self._unsubscribe(job_id))
+
+    async def _unsubscribe(self, job_id: str) -> None:
+        if job_id in self._watchers:
+            return
+        try:
+            await self._pubsub.unsubscribe(_channel(job_id))
+        except (RedisError, OSError):
+            pass
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except (RedisError, OSError, RuntimeError) as e:
+                log_event(logger, 'job events connection lost', error_type=type(e).__name__, error_msg=str(e))
+                await asyncio.sleep(1)
+                if not await self._resubscribe():
+                    return
+                continue
+            if message is None or message["type"] != "message":
+                continue
+
+            job_id = message["channel"].decode().removeprefix(CHANNEL_PREFIX)
+            watchers = self._watchers.get(job_id)
+            if not watchers:
+                continue
+            # encoded once here, shared by every watcher of the job
+            event = orjson.loads(message["data"])
+            line = event.pop("line", None)
+            status_frame = sse("status", event)
+            line_frame = None
+            if line is not None:
+                line_frame = sse("log", {"execution_id": event["execution_id"], "line": line, "ts": event["ts"]})
+            for watcher in watchers:
+                watcher.push(event["execution_id"], status_frame, line_frame)
+
+    async def _resubscribe(self) -> bool:
+        # events published while disconnected are lost; watchers are told to resync.
+        # with nobody watching the reader stops, the next watch() starts it again
+        await self._pubsub.reset()
+        if not self._watchers:
+            return False
+        try:
+            await self._pubsub.subscribe(*(_channel(job_id) for job_id in self._watchers))
+        except (RedisError, OSError):
+            return True
+        for watchers in self._watchers.values():
+            for watcher in watchers:
+                watcher.overflow = True
+                watcher.ready.set()
+        return True
+
+
+hub = JobEventsHub()
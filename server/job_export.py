@@ -0,0 +1,128 @@
+import csv
+import io
+import uuid
+from typing import Iterator
+
+import orjson
+from sqlalchemy import select, func, cast, Float
+from sqlalchemy.orm import sessionmaker
+
+from db.models import Execution, ExecutionLogs, Host
+
+from config import EXPORT_BATCH_SIZE
+
+try:
+    import pyarrow as pa
+except ImportError:  # arrow export is optional
+    pa = None
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+COLUMNS = (
+    "execution_id", "host_id", "hostname", "status", "attempts", "retries",
+    "created_at", "queued_at", "started_at", "agent_started_at", "agent_finished_at", "finished_at",
+    "backoff_seconds", "agent_seconds", "total_seconds", "last_log_line",
+)
+_TIMESTAMPS = ("created_at", "queued_at", "started_at", "agent_started_at", "agent_finished_at", "finished_at")
+
+
+def _statement(job_id: uuid.UUID):
+    # one probe of ix_execution_logs_execution_id_ts per row
+    last_log_line = (
+        select(ExecutionLogs.line)
+        .where(ExecutionLogs.execution_id == Execution.uid)
+        .order_by(ExecutionLogs.ts.desc())
+        .limit(1)
+        .correlate(Execution)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            Execution.uid,
+            Execution.host_id,
+            Host.hostname,
+            Execution.status,
+            Execution.attempts,
+            Execution.retries,
+            Execution.created_at,
+            Execution.queued_at,
+            Execution.started_at,
+            Execution.agent_started_at,
+            Execution.agent_finished_at,
+            Execution.finished_at,
+            Execution.backoff_seconds,
+            cast(func.extract('epoch', Execution.agent_finished_at - Execution.agent_started_at), Float),
+            cast(func.extract('epoch', Execution.finished_at - Execution.created_at), Float),
+            last_log_line,
+        )
+        .join(Host, Host.uid == Execution.host_id)
+        .where(Execution.job_id == job_id)
+        .order_by(Host.hostname.asc())
+    )
+
+
+def _batches(session_factory: sessionmaker, job_id: uuid.UUID) -> Iterator[list[tuple]]:
+    # stream_results makes psycopg2 use a server-side (named) cursor, so only one batch is in memory
+    with session_factory.begin() as session:
+        result = session.execute(
+            _statement(job_id),
+            execution_options={"stream_results": True, "yield_per": EXPORT_BATCH_SIZE},
+        )
+        for partition in result.partitions():
+            yield [(str(r[0]), str(r[1]), r[2], r[3].value, *r[4:]) for r in partition]
+
+
+def _csv(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for rows in batches:
+        writer.writerows(
+            tuple(v.isoformat() if hasattr(v, "isoformat") else v for v in row) for row in rows
+        )
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def _ndjson(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(orjson.dumps(dict(zip(COLUMNS, row))) + b"\n" for row in rows)
+
+
+def _arrow_schema():
+    types = {
+        "attempts": pa.int32(),
+        "retries": pa.int32(),
+        "backoff_seconds": pa.float64(),
+        "agent_seconds": pa.float64(),
+        "total_seconds": pa.float64(),
+    } | {name: pa.timestamp("us", tz="UTC") for name in _TIMESTAMPS}
+    return pa.schema([(name, types.get(name, pa.string())) for name in COLUMNS])
+
+
+def _arrow(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    schema = _arrow_schema()
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in batches:
+            columns = list(zip(*rows)) if rows else [() for _ in COLUMNS]
+            writer.write_batch(pa.record_batch([list(c) for c in columns], schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # end-of-stream marker written on close
+    yield sink.getvalue()
+
+
+WRITERS = {"csv": _csv, "ndjson": _ndjson, "arrow": _arrow}
+
+
+def export(session_factory: sessionmaker, job_id: uuid.UUID, fmt: str) -> Iterator[bytes]:
+    return WRITERS[fmt](_batches(session_factory, job_id))
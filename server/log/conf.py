@@ -1,31 +1,43 @@
-import json
+import atexit
 import logging
+import queue
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+FIELDS = (
+    "event", 'service',
+    "request_id",
+    "job_id",
+    "execution_id",
+    "host_id",
+    "hostnames",
+    "command_type",
+    "status",
+    "attempt", "celery_retries",
+    "duration_ms", "backoff_sec",
+    "error_type", "error_msg",
+    "count", "sample_rate", "suppressed",
+    "manifest", "rows", "bytes",
+    "shard_id", "shards", "executions", "redispatched",
+    "processes", "target", "backlog",
+    "profile", "phases",
+)
 
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         data = {
-            "ts": datetime.now(timezone.utc).isoformat(),
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "msg": record.getMessage(),
         }
 
-        for k in (
-                "event", 'service',
-                "request_id",
-                "job_id",
-                "execution_id",
-                "host_id",
-                "hostnames",
-                "command_type",
-                "status",
-                "attempt", "celery_retries",
-                "duration_ms", "backoff_sec",
-                "error_type", "error_msg",
-        ):
-            v = getattr(record, k, None)
+        attrs = record.__dict__
+        for k in FIELDS:
+            v = attrs.get(k)
             if v is not None:
                 data[k] = v
 
@@ -33,14 +45,53 @@ class JsonFormatter(logging.Formatter):
             data["exc_type"] = record.exc_info[0].__name__
             data["exc"] = self.formatException(record.exc_info)
 
-        return json.dumps(data, ensure_ascii=False)
+        return orjson.dumps(data, default=str).decode()
+
+
+class _LocalQueueHandler(QueueHandler):
+    # the queue never leaves the process, so the record only needs its message
+    # rendered; formatting to JSON happens on the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: QueueListener | None = None
 
 
 def setup_logging(level: str = "INFO") -> None:
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+
     root = logging.getLogger()
     root.handlers.clear()
     root.setLevel(level)
 
     h = logging.StreamHandler()
     h.setFormatter(JsonFormatter())
-    root.addHandler(h)
\ No newline at end of file
+
+    q = queue.SimpleQueue()
+    root.addHandler(_LocalQueueHandler(q))
+
+    _listener = QueueListener(q, h, respect_handler_level=True)
+    _listener.start()
+
+
+def restart_listener() -> None:
+    """Starts a fresh listener thread after fork, reusing the parent's queue and handlers."""
+    global _listener
+    if _listener is None:
+        return
+    _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+@atexit.register
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
@@ -1,5 +1,58 @@
 import logging
+import random
+import threading
+import time
+
+from config import LOG_SAMPLE_RATES, LOG_RATE_LIMITS
+
+
+class EventSampler:
+    """Decides whether a log_event call is emitted, before a LogRecord is built.
+
+    `sample_rates` keeps a random fraction of an event, `rate_limits` caps an event
+    at N records per second; the next record that passes reports how many were suppressed.
+    """
+
+    def __init__(self, sample_rates: dict[str, float], rate_limits: dict[str, float]):
+        self.sample_rates = sample_rates
+        self.rate_limits = rate_limits
+        self._windows: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, event: str) -> dict | None:
+        fields = {}
+
+        rate = self.sample_rates.get(event)
+        if rate is not None:
+            if random.random() >= rate:
+                return None
+            fields["sample_rate"] = rate
+
+        limit = self.rate_limits.get(event)
+        if limit is not None:
+            now = time.monotonic()
+            with self._lock:
+                window = self._windows.setdefault(event, [now, 0, 0])
+                if now - window[0] >= 1.0:
+                    window[:] = [now, 0, window[2]]
+                if window[1] >= limit:
+                    window[2] += 1
+                    return None
+                window[1] += 1
+                if window[2]:
+                    fields["suppressed"] = window[2]
+                    window[2] = 0
+
+        return fields
+
+
+sampler = EventSampler(LOG_SAMPLE_RATES, LOG_RATE_LIMITS)
 
 
 def log_event(log: logging.Logger, event: str, msg: str = "", **fields):
-    log.info(msg or event, extra={"event": event, **fields})
+    if not log.isEnabledFor(logging.INFO):
+        return
+    extra = sampler.allow(event)
+    if extra is None:
+        return
+    log.info(msg or event, extra={"event": event, **fields, **extra})
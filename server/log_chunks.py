@@ -0,0 +1,101 @@
+import struct
+import uuid
+from typing import Iterable
+
+import zstandard
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session as OrmSession
+
+from db.models import ExecutionLogChunk
+
+from config import LOG_CHUNK_MAX_LINES, LOG_CHUNK_MAX_BYTES, LOG_CHUNK_ZSTD_LEVEL
+
+
+def _split(lines: Iterable[str]) -> Iterable[list[bytes]]:
+    block, size = [], 0
+    for line in lines:
+        encoded = line.encode()
+        if block and (len(block) >= LOG_CHUNK_MAX_LINES or size + len(encoded) > LOG_CHUNK_MAX_BYTES):
+            yield block
+            block, size = [], 0
+        block.append(encoded)
+        size += len(encoded)
+    if block:
+        yield block
+
+
+def encode(block: list[bytes]) -> dict:
+    ends, end = [], 0
+    for line in block:
+        end += len(line)
+        ends.append(end)
+    raw = b"".join(block)
+    return {
+        "line_count": len(block),
+        "raw_bytes": len(raw),
+        "offsets": struct.pack(f"<{len(ends)}I", *ends),
+        "data": zstandard.ZstdCompressor(level=LOG_CHUNK_ZSTD_LEVEL).compress(raw),
+    }
+
+
+def decode(offsets: bytes, data: bytes, start: int = 0, stop: int | None = None) -> list[str]:
+    """Lines [start, stop) of one block."""
+    ends = struct.unpack(f"<{len(offsets) // 4}I", offsets)
+    raw = zstandard.ZstdDecompressor().decompress(data)
+    stop = len(ends) if stop is None else min(stop, len(ends))
+    return [raw[(ends[i - 1] if i else 0):ends[i]].decode(errors="replace") for i in range(start, stop)]
+
+
+def line_count(session: OrmSession, execution_id: uuid.UUID | str) -> int:
+    last = session.execute(
+        select(ExecutionLogChunk.first_line + ExecutionLogChunk.line_count)
+        .where(ExecutionLogChunk.execution_id == execution_id)
+        .order_by(ExecutionLogChunk.first_line.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+    return last or 0
+
+
+def append(session: OrmSession, execution_id: uuid.UUID | str, lines: Iterable[str]) -> int:
+    """Appends output lines of an execution in the caller's transaction. Returns the number of lines written.
+
+    An execution has one writer at a time (it runs under the host lock), the unique
+    (execution_id, first_line) constraint catches anything else.
+    """
+    first_line = line_count(session, execution_id)
+    rows = []
+    for block in _split(lines):
+        rows.append({"execution_id": execution_id, "first_line": first_line} | encode(block))
+        first_line += len(block)
+    if rows:
+        session.execute(insert(ExecutionLogChunk), rows)
+    return sum(row["line_count"] for row in rows)
+
+
+def read(session: OrmSession, execution_id: uuid.UUID | str, start: int = 0, limit: int | None = None) -> list[dict]:
+    """Output lines [start, start + limit) of an execution; only the blocks covering the range are fetched."""
+    stmt = (
+        select(ExecutionLogChunk.first_line, ExecutionLogChunk.ts, ExecutionLogChunk.offsets, ExecutionLogChunk.data)
+        .where(
+            ExecutionLogChunk.execution_id == execution_id,
+            ExecutionLogChunk.first_line + ExecutionLogChunk.line_count > start,
+        )
+        .order_by(ExecutionLogChunk.first_line.asc())
+    )
+    if limit is not None:
+        stmt = stmt.where(ExecutionLogChunk.first_line < start + limit)
+    stop = start + limit if limit is not None else None
+
+    result = []
+    for first_line, ts, offsets, data in session.execute(stmt):
+        lines = decode(offsets, data, max(0, start - first_line), stop - first_line if stop is not None else None)
+        from_line = max(start, first_line)
+        result.extend(
+            {"line_no": from_line + i, "ts": ts, "line": line} for i, line in enumerate(lines)
+        )
+    return result
+
+
+def tail(session: OrmSession, execution_id: uuid.UUID | str, n: int) -> list[dict]:
+    total = line_count(session, execution_id)
+    return read(session, execution_id, max(0, total - n), n)
@@ -1,16 +1,19 @@
 from fastapi import FastAPI
-from router import jobs, host
+from router import jobs, host, system
 
 from sqlalchemy import insert, select
 from db.models import Host
 from db.db import Session
 
 from log.conf import setup_logging
+import profiling
 setup_logging()
 app = FastAPI()
+app.add_middleware(profiling.ProfilingMiddleware)
 
 app.include_router(jobs.router)
 app.include_router(host.router)
+app.include_router(system.router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+import os
+import shutil
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import select, func
+
+from config import PROMETHEUS_MULTIPROC_DIR
+
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+WEBHOOK_DURATION = Histogram(
+    "webhook_duration_seconds", "Time spent handling POST /webhook/jobs/",
+    ["command_type", "created"], buckets=LATENCY_BUCKETS,
+)
+PLAN_BATCH_DURATION = Histogram(
+    "plan_job_batch_duration_seconds", "Time to claim, queue and publish one plan_job batch",
+    buckets=LATENCY_BUCKETS,
+)
+PLAN_BATCH_SIZE = Histogram(
+    "plan_job_batch_size", "Executions dispatched per plan_job batch",
+    buckets=(1, 10, 50, 100, 200, 500, 1000),
+)
+AGENT_CALL_DURATION = Histogram(
+    "agent_call_duration_seconds", "Agent call duration by outcome",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+HOST_LOCK_WAIT = Histogram(
+    "host_lock_wait_seconds", "Time spent in pg_try_advisory_lock for a host",
+    ["acquired"], buckets=LATENCY_BUCKETS,
+)
+EXECUTION_RETRIES = Counter(
+    "execution_retries_total", "run_execution retries scheduled", ["reason"],
+)
+EXECUTION_FINISHED = Counter(
+    "execution_finished_total", "Executions that reached a final status", ["status"],
+)
+CIRCUIT_EVENTS = Counter(
+    "host_circuit_events_total", "Per-host circuit breaker transitions and rejected executions", ["event"],
+)
+COALESCE_LOOKUPS = Counter(
+    "coalesce_lookups_total", "Coalescing lookups for idempotent commands by result (hit, wait, miss)", ["result"],
+)
+BROKER_PUBLISHES = Counter(
+    "broker_publishes_total", "Messages published to the Celery broker", ["task"],
+)
+
+
+class DbStateCollector:
+    """Reads outbox backlog and execution counts from Postgres at scrape time."""
+
+    def describe(self):
+        # registering on an auto-describing registry would otherwise run collect(), i.e. query Postgres on import
+        return []
+
+    def collect(self):
+        from db.db import Session
+        from db.models import Execution, Outbox
+
+        with Session() as session:
+            outbox_backlog = session.execute(
+                select(func.count(Outbox.uid)).where(Outbox.status == Outbox.Status.NEW)
+            ).scalar_one()
+            rows = session.execute(
+                select(Execution.status, func.count(Execution.uid)).group_by(Execution.status)
+            ).all()
+
+        backlog = GaugeMetricFamily("outbox_backlog", "Outbox events waiting to be published")
+        backlog.add_metric([], outbox_backlog)
+        yield backlog
+
+        counts = {status.value: 0 for status in Execution.Status}
+        counts |= {status.value: cnt for status, cnt in rows}
+        executions = GaugeMetricFamily("executions", "Executions by status", labels=["status"])
+        for status, cnt in counts.items():
+            executions.add_metric([status], cnt)
+        yield executions
+
+
+class QueueStateCollector:
+    """Reads broker queue lengths, parked retries and the pools reported by autoscaling workers at scrape time."""
+
+    def describe(self):
+        # like DbStateCollector: nothing is read from Redis or Postgres on registration
+        return []
+
+    def collect(self):
+        from db.db import Session
+        import queue_state
+
+        broker = queue_state.broker_depth()
+        with Session() as session:
+            executions = queue_state.execution_counts(session)
+        pools = queue_state.pools()
+
+        queued = GaugeMetricFamily("broker_queue_length", "Messages waiting in the broker queue", labels=["queue"])
+        for queue, length in broker["queues"].items():
+            queued.add_metric([queue], length)
+        yield queued
+
+        unacked = GaugeMetricFamily("broker_unacked", "Messages delivered to workers and not acked yet")
+        unacked.add_metric([], broker["unacked"])
+        yield unacked
+
+        retries = GaugeMetricFamily("execution_retries_parked", "QUEUED executions waiting for their next attempt",
+                                    labels=["state"])
+        retries.add_metric(["delayed"], executions["delayed_retries"])
+        retries.add_metric(["due"], executions["due_retries"])
+        yield retries
+
+        for name, doc in (("processes", "Pool processes"), ("busy", "Pool processes running a task"),
+                          ("target", "Pool size the autoscaler is heading for")):
+            gauge = GaugeMetricFamily(f"worker_pool_{name}", doc, labels=["hostname"])
+            for pool in pools:
+                gauge.add_metric([pool["hostname"]], pool[name])
+            yield gauge
+
+
+def build_registry(with_db_state: bool = False) -> CollectorRegistry:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    if with_db_state:
+        registry.register(DbStateCollector())
+        registry.register(QueueStateCollector())
+    return registry
+
+
+def render(registry: CollectorRegistry) -> bytes:
+    return generate_latest(registry)
+
+
+def start_worker_metrics_server(port: int) -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    start_http_server(port, registry=build_registry())
+
+
+def mark_worker_process_dead(pid: int) -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
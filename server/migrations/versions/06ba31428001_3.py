@@ -0,0 +1,44 @@
+"""3
+
+Revision ID: 06ba31428001
+Revises: 4d29aef7b5d7
+Create Date: 2026-10-19 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '06ba31428001'
+down_revision: Union[str, Sequence[str], None] = '4d29aef7b5d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('jobs', sa.Column('plan_requested_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('jobs', sa.Column('plan_published_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('executions', sa.Column('queued_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('executions', sa.Column('dispatched_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('executions', sa.Column('lock_acquired_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('executions', sa.Column('agent_started_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('executions', sa.Column('agent_finished_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('executions', sa.Column('backoff_seconds', sa.Float(), server_default='0', nullable=False))
+    op.create_index('ix_executions_job_id_status', 'executions', ['job_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_executions_job_id_status', table_name='executions')
+    op.drop_column('executions', 'backoff_seconds')
+    op.drop_column('executions', 'agent_finished_at')
+    op.drop_column('executions', 'agent_started_at')
+    op.drop_column('executions', 'lock_acquired_at')
+    op.drop_column('executions', 'dispatched_at')
+    op.drop_column('executions', 'queued_at')
+    op.drop_column('jobs', 'plan_published_at')
+    op.drop_column('jobs', 'plan_requested_at')
@@ -0,0 +1,33 @@
+"""12
+
+Revision ID: 0a5d3e9c7b61
+Revises: f1c6d2b8e047
+Create Date: 2026-10-19 09:50:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a5d3e9c7b61'
+down_revision: Union[str, Sequence[str], None] = 'f1c6d2b8e047'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # executions is large and written all the time: build without blocking writes
+    with op.get_context().autocommit_block():
+        op.create_index('ix_executions_status_next_attempt_at', 'executions', ['status', 'next_attempt_at'],
+                        unique=False, postgresql_concurrently=True,
+                        postgresql_where=sa.text("status IN ('NEW', 'QUEUED', 'RUNNING')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_executions_status_next_attempt_at', table_name='executions', postgresql_concurrently=True)
@@ -0,0 +1,34 @@
+"""4
+
+Revision ID: 5b1e0c7d9a24
+Revises: 06ba31428001
+Create Date: 2026-10-19 11:02:47.918320
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e0c7d9a24'
+down_revision: Union[str, Sequence[str], None] = '06ba31428001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('executions', sa.Column('retries', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('executions', sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_executions_next_attempt_at', 'executions', ['next_attempt_at'], unique=False,
+                    postgresql_where=sa.text("status = 'QUEUED' AND next_attempt_at IS NOT NULL"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_executions_next_attempt_at', table_name='executions',
+                  postgresql_where=sa.text("status = 'QUEUED' AND next_attempt_at IS NOT NULL"))
+    op.drop_column('executions', 'next_attempt_at')
+    op.drop_column('executions', 'retries')
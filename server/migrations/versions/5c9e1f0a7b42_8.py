@@ -0,0 +1,42 @@
+"""8
+
+Revision ID: 5c9e1f0a7b42
+Revises: a41f6c8e2d37
+Create Date: 2026-10-19 15:04:12.730416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c9e1f0a7b42'
+down_revision: Union[str, Sequence[str], None] = 'a41f6c8e2d37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('execution_log_chunks',
+    sa.Column('execution_id', sa.Uuid(), nullable=False),
+    sa.Column('first_line', sa.Integer(), nullable=False),
+    sa.Column('line_count', sa.Integer(), nullable=False),
+    sa.Column('raw_bytes', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('offsets', sa.LargeBinary(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('uid', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['execution_id'], ['executions.uid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('uid'),
+    sa.UniqueConstraint('execution_id', 'first_line', name='execution_log_chunks_execution_id_first_line')
+    )
+    # the blocks are already compressed, TOAST compression would only burn CPU
+    op.execute("ALTER TABLE execution_log_chunks ALTER COLUMN data SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('execution_log_chunks')
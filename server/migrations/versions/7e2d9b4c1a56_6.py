@@ -0,0 +1,28 @@
+"""6
+
+Revision ID: 7e2d9b4c1a56
+Revises: c3a8f4e21b90
+Create Date: 2026-10-19 12:40:17.204311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2d9b4c1a56'
+down_revision: Union[str, Sequence[str], None] = 'c3a8f4e21b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_execution_logs_execution_id_ts', 'execution_logs', ['execution_id', 'ts'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_execution_logs_execution_id_ts', table_name='execution_logs')
@@ -0,0 +1,42 @@
+"""7
+
+Revision ID: a41f6c8e2d37
+Revises: 7e2d9b4c1a56
+Create Date: 2026-10-19 13:22:41.518092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41f6c8e2d37'
+down_revision: Union[str, Sequence[str], None] = '7e2d9b4c1a56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('archived_jobs',
+    sa.Column('external_id', sa.String(length=255), nullable=False),
+    sa.Column('location', sa.Text(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('uid', sa.Uuid(), nullable=False),
+    sa.PrimaryKeyConstraint('uid'),
+    sa.UniqueConstraint('external_id')
+    )
+    op.create_table('archived_executions',
+    sa.Column('job_id', sa.Uuid(), nullable=False),
+    sa.Column('uid', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['job_id'], ['archived_jobs.uid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('uid')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('archived_executions')
+    op.drop_table('archived_jobs')
@@ -0,0 +1,30 @@
+"""10
+
+Revision ID: b7f2a9c4d318
+Revises: e8b3d60f15c9
+Create Date: 2026-10-19 19:21:36.104582
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f2a9c4d318'
+down_revision: Union[str, Sequence[str], None] = 'e8b3d60f15c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('jobs', sa.Column('steps', sa.JSON(), nullable=True))
+    op.add_column('executions', sa.Column('step', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('executions', 'step')
+    op.drop_column('jobs', 'steps')
@@ -0,0 +1,32 @@
+"""5
+
+Revision ID: c3a8f4e21b90
+Revises: 5b1e0c7d9a24
+Create Date: 2026-10-19 11:48:05.530172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a8f4e21b90'
+down_revision: Union[str, Sequence[str], None] = '5b1e0c7d9a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('executions', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_executions_lease_expires_at', 'executions', ['lease_expires_at'], unique=False,
+                    postgresql_where=sa.text("status = 'RUNNING'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_executions_lease_expires_at', table_name='executions',
+                  postgresql_where=sa.text("status = 'RUNNING'"))
+    op.drop_column('executions', 'lease_expires_at')
@@ -0,0 +1,50 @@
+"""9
+
+Revision ID: e8b3d60f15c9
+Revises: 5c9e1f0a7b42
+Create Date: 2026-10-19 17:41:55.206387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3d60f15c9'
+down_revision: Union[str, Sequence[str], None] = '5c9e1f0a7b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('plan_shards',
+    sa.Column('job_id', sa.Uuid(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('uid_from', sa.Uuid(), nullable=True),
+    sa.Column('uid_to', sa.Uuid(), nullable=True),
+    sa.Column('status', sa.Enum('NEW', 'RUNNING', 'DONE', name='plan_shard_status'), nullable=False),
+    sa.Column('last_uid', sa.Uuid(), nullable=True),
+    sa.Column('dispatched', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('uid', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['job_id'], ['jobs.uid'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('uid'),
+    sa.UniqueConstraint('job_id', 'shard', name='plan_shards_job_id_shard')
+    )
+    op.create_index('ix_executions_job_id_status_uid', 'executions', ['job_id', 'status', 'uid'], unique=False)
+    op.drop_index('ix_executions_job_id_status', table_name='executions')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_executions_job_id_status', 'executions', ['job_id', 'status'], unique=False)
+    op.drop_index('ix_executions_job_id_status_uid', table_name='executions')
+    op.drop_table('plan_shards')
+    sa.Enum(name='plan_shard_status').drop(op.get_bind(), checkfirst=True)
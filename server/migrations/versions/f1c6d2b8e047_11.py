@@ -0,0 +1,30 @@
+"""11
+
+Revision ID: f1c6d2b8e047
+Revises: b7f2a9c4d318
+Create Date: 2026-10-19 21:08:53.517290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6d2b8e047'
+down_revision: Union[str, Sequence[str], None] = 'b7f2a9c4d318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a new enum value cannot be used in the transaction that adds it
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE job_status ADD VALUE IF NOT EXISTS 'CANCELLED'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres cannot drop an enum value; cancelled jobs are kept as FAILED
+    op.execute("UPDATE jobs SET status = 'FAILED' WHERE status = 'CANCELLED'")
@@ -0,0 +1,269 @@
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import orjson
+from redis import RedisError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+from db.redis import redis_client
+from log.utils import log_event
+
+from config import PROFILE_TARGETS, PROFILE_REFRESH_SEC, PROFILE_DIR, PROFILE_INTERVAL_SEC
+
+logger = logging.getLogger('profiling')
+
+TARGETS_KEY = "profiling_targets"
+
+_SOURCE_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+# "POST /jobs/{job_id}/cancel": only targets of this shape are matched against the route table
+_ROUTE_TARGET = re.compile(r"^[A-Z]+ /")
+
+_current: contextvars.ContextVar["Profile | None"] = contextvars.ContextVar("profile", default=None)
+_targets: dict[str, float] = {}
+# methods of the route targets among _targets, so other requests skip matching the route
+_route_methods: frozenset[str] = frozenset()
+_refresh = threading.Event()
+_refresher_pid: int | None = None
+_seq = itertools.count()
+
+
+def _apply(rates: dict[str, float]) -> None:
+    global _targets, _route_methods
+    _route_methods = frozenset(target.split(" ", 1)[0] for target in rates if _ROUTE_TARGET.match(target))
+    _targets = rates
+
+
+_apply(dict(PROFILE_TARGETS))
+
+
+def _read_targets() -> None:
+    while True:
+        try:
+            raw = redis_client.get(TARGETS_KEY)
+        except RedisError as e:
+            # the last targets read stay in effect
+            log_event(logger, 'profiling targets unavailable', error_type=type(e).__name__, error_msg=str(e))
+        else:
+            _apply(orjson.loads(raw) if raw is not None else dict(PROFILE_TARGETS))
+        _refresh.wait(PROFILE_REFRESH_SEC)
+        _refresh.clear()
+
+
+def _ensure_refresher() -> None:
+    # started lazily, and again in a forked child (a prefork pool process), where the parent's thread does not run
+    global _refresher_pid
+    if _refresher_pid != os.getpid():
+        _refresher_pid = os.getpid()
+        threading.Thread(target=_read_targets, name="profiling-targets", daemon=True).start()
+
+
+def targets() -> dict[str, float]:
+    """Sample rates by task name or route: the ones set at runtime, else PROFILE_TARGETS.
+
+    A daemon thread rereads them from Redis every PROFILE_REFRESH_SEC; the caller never waits on Redis.
+    """
+    _ensure_refresher()
+    return _targets
+
+
+def set_targets(rates: dict[str, float] | None) -> None:
+    """Replaces the targets of every process within PROFILE_REFRESH_SEC; None goes back to PROFILE_TARGETS."""
+    if rates is None:
+        redis_client.delete(TARGETS_KEY)
+    else:
+        redis_client.set(TARGETS_KEY, orjson.dumps(rates))
+    _apply(dict(rates) if rates is not None else dict(PROFILE_TARGETS))
+    _refresh.set()
+
+
+@functools.lru_cache(maxsize=4096)
+def _short(filename: str) -> str:
+    if filename.startswith(_SOURCE_ROOT):
+        return filename[len(_SOURCE_ROOT):]
+    _, found, rest = filename.rpartition("site-packages" + os.sep)
+    return rest if found else filename
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _slug(target: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", target).strip("_")
+
+
+class Profile:
+    """Samples the stack of the thread running one task or request and times its phases.
+
+    A daemon thread reads the thread's frame from sys._current_frames() every PROFILE_INTERVAL_SEC;
+    the profiled thread itself only pays for the phase timers. On an API worker the thread is the
+    event loop, so samples taken while the request awaits belong to whatever the loop runs meanwhile.
+    """
+
+    def __init__(self, target: str, rate: float):
+        self.target = target
+        self.rate = rate
+        self.stacks: Counter[str] = Counter()
+        self.phases: dict[str, list] = {}
+        self._open: dict[str, float] = {}
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{_slug(target)}", daemon=True)
+        self._started = time.perf_counter()
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(PROFILE_INTERVAL_SEC):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def begin(self, phase: str) -> None:
+        self._open[phase] = time.perf_counter()
+
+    def end(self, phase: str) -> None:
+        started = self._open.pop(phase, None)
+        if started is None:
+            return
+        timer = self.phases.setdefault(phase, [0, 0.0])
+        timer[0] += 1
+        timer[1] += time.perf_counter() - started
+
+    def phase_summary(self) -> dict:
+        return {name: {"count": count, "ms": round(seconds * 1000, 3)} for name, (count, seconds) in self.phases.items()}
+
+    def write(self) -> str:
+        directory = os.path.join(PROFILE_DIR, _slug(self.target))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_seq)}")
+        with open(path + ".folded", "w") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+        with open(path + ".json", "wb") as f:
+            f.write(orjson.dumps({
+                "target": self.target,
+                "sample_rate": self.rate,
+                "interval_sec": PROFILE_INTERVAL_SEC,
+                "duration_ms": round(self.duration * 1000, 3),
+                "samples": sum(self.stacks.values()),
+                "phases": self.phase_summary(),
+            }, option=orjson.OPT_INDENT_2))
+        return path + ".folded"
+
+
+def start(target: str) -> Profile | None:
+    """Starts profiling the current task or request if `target` is drawn at its sample rate."""
+    rate = targets().get(target)
+    if not rate or random.random() >= rate:
+        _current.set(None)
+        return None
+    profile = Profile(target, rate)
+    profile.start()
+    _current.set(profile)
+    return profile
+
+
+def stop() -> None:
+    profile = _current.get()
+    if profile is None:
+        return
+    _current.set(None)
+    profile.stop()
+    try:
+        path = profile.write()
+    except OSError as e:
+        log_event(logger, 'profile write failed', error_type=type(e).__name__, error_msg=str(e))
+        return
+    log_event(logger, 'profile written', profile=path, duration_ms=round(profile.duration * 1000, 1),
+              count=sum(profile.stacks.values()), phases=profile.phase_summary())
+
+
+def begin_phase(name: str) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.begin(name)
+
+
+def end_phase(name: str) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.end(name)
+
+
+@contextmanager
+def phase(name: str):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.begin(name)
+    try:
+        yield
+    finally:
+        profile.end(name)
+
+
+class ProfilingMiddleware:
+    """Profiles API requests by route template ("POST /jobs/{job_id}/cancel"); samples async routes only,
+    sync ones run on the threadpool while the sampled event loop waits."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # matching the route scans the route table, so it is only done while a route of this method is profiled
+        _ensure_refresher()
+        if scope["type"] != "http" or scope["method"] not in _route_methods:
+            await self.app(scope, receive, send)
+            return
+        start(_route(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stop()
+
+
+def _route(scope) -> str:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f"{scope['method']} {route.path}"
+    return f"{scope['method']} {scope['path']}"
+
+
+# every engine, the lock and replica ones included; a no-op unless the calling context is being profiled
+@event.listens_for(Engine, "before_cursor_execute")
+def _db_started(conn, cursor, statement, parameters, context, executemany):
+    begin_phase("db")
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _db_finished(conn, cursor, statement, parameters, context, executemany):
+    end_phase("db")
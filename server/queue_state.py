@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+
+from db.models import Execution, Outbox
+from db.redis import redis_client
+
+from config import TASK_QUEUE, WORKER_POOL_TTL_SEC
+
+# hash of messages delivered to a worker and not acked yet (kombu's Redis transport, default key)
+UNACKED_KEY = "unacked"
+POOLS_KEY = "worker_pools"
+
+
+def _pool_key(hostname: str) -> str:
+    return f"worker_pool:{hostname}"
+
+
+def broker_depth() -> dict:
+    """Messages waiting in the broker queue and messages held by workers (prefetched or running)."""
+    pipe = redis_client.pipeline()
+    pipe.llen(TASK_QUEUE)
+    pipe.hlen(UNACKED_KEY)
+    waiting, unacked = pipe.execute()
+    return {"queues": {TASK_QUEUE: waiting}, "unacked": unacked}
+
+
+def execution_counts(session) -> dict:
+    now = datetime.now(timezone.utc)
+    queued = Execution.status == Execution.Status.QUEUED
+    new, ready, delayed, due, running = session.execute(
+        select(
+            func.count().filter(Execution.status == Execution.Status.NEW),
+            func.count().filter(queued, Execution.next_attempt_at.is_(None)),
+            func.count().filter(queued, Execution.next_attempt_at.is_not(None)),
+            func.count().filter(queued, Execution.next_attempt_at <= now),
+            func.count().filter(Execution.status == Execution.Status.RUNNING),
+        ).where(Execution.status.in_((Execution.Status.NEW, Execution.Status.QUEUED, Execution.Status.RUNNING)))
+    ).one()
+    # delayed retries live in the table, not in the broker, until schedule_retries dispatches them;
+    # due ones are those it has not picked up yet
+    return {"new": new, "queued": ready, "delayed_retries": delayed, "due_retries": due, "running": running}
+
+
+def outbox_backlog(session) -> dict:
+    backlog, oldest = session.execute(
+        select(func.count(Outbox.uid), func.min(Outbox.created_at)).where(Outbox.status == Outbox.Status.NEW)
+    ).one()
+    age = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest is not None else 0.0
+    return {"backlog": backlog, "oldest_sec": round(age, 3)}
+
+
+def publish_pool(hostname: str, pool: dict) -> int:
+    """Records a worker's pool state; returns how many workers have reported recently, this one included."""
+    now = time.time()
+    pipe = redis_client.pipeline()
+    pipe.hset(_pool_key(hostname), mapping=pool | {"ts": now})
+    pipe.expire(_pool_key(hostname), WORKER_POOL_TTL_SEC)
+    pipe.zadd(POOLS_KEY, {hostname: now})
+    pipe.zremrangebyscore(POOLS_KEY, "-inf", now - WORKER_POOL_TTL_SEC)
+    pipe.zcard(POOLS_KEY)
+    return pipe.execute()[-1]
+
+
+def pools() -> list[dict]:
+    now = time.time()
+    hostnames = [h.decode() for h in redis_client.zrangebyscore(POOLS_KEY, now - WORKER_POOL_TTL_SEC, "+inf")]
+    pipe = redis_client.pipeline()
+    for hostname in hostnames:
+        pipe.hgetall(_pool_key(hostname))
+    result = []
+    for hostname, pool in zip(hostnames, pipe.execute()):
+        if not pool:
+            continue
+        pool = {k.decode(): float(v) for k, v in pool.items()}
+        result.append({
+            "hostname": hostname,
+            "processes": int(pool["processes"]),
+            "busy": int(pool["busy"]),
+            "reserved": int(pool["reserved"]),
+            "min": int(pool["min"]),
+            "max": int(pool["max"]),
+            "target": int(pool["target"]),
+            "task_sec": round(pool["task_sec"], 3),
+            "age_sec": round(now - pool["ts"], 3),
+        })
+    return result
@@ -6,6 +6,7 @@ from sqlalchemy import select, insert, delete
 
 from db.models import Job, Host, HostCommandBlock
 from db.db import Session
+import host_health
 
 router = APIRouter(tags=['host'])
 
@@ -60,3 +61,13 @@ def delete_host_block(host_id: uuid.UUID, command_type: Job.CommandType):
         )
 
         return {"deleted": int(res.rowcount or 0)}
+
+
+@router.get("/hosts/{host_id}/health")
+def get_host_health(host_id: uuid.UUID):
+    with Session() as session:
+        exists = session.execute(select(Host.uid).where(Host.uid == host_id)).scalar_one_or_none()
+    if not exists:
+        raise HTTPException(status_code=404, detail="Host not found")
+
+    return host_health.health(str(host_id))
@@ -1,44 +1,98 @@
+import asyncio
+import itertools
 import logging
+import time
 import uuid
-from typing import Optional
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Literal
 
-from fastapi import APIRouter, HTTPException, Query
-from sqlalchemy import insert, select, update, func
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from redis import RedisError
+from sqlalchemy import insert, select, update, func, literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 
-from db.db import Session
-from db.models import Host, Job, Execution, Outbox, HostCommandBlock, ExecutionLogs
+from db.db import Session, read_session, write_lsn
+from db.models import Host, Job, Execution, Outbox, HostCommandBlock, ExecutionLogs, ArchivedJob, ArchivedExecution
 from log.utils import log_event
+from metrics import WEBHOOK_DURATION
+import archive
+import job_cache
+import job_cancel
+import job_events
+import job_export
+import log_chunks
 
-from config import REQUIRES_APPROVAL
+from config import REQUIRES_APPROVAL, REPLICA_MAX_LAG_SEC, REPLICA_CHECK_INTERVAL_SEC
+from config import JOB_EVENTS_FLUSH_SEC, JOB_EVENTS_HEARTBEAT_SEC
 
 logger = logging.getLogger("api")
 
 
+class JobStep(BaseModel):
+    command_type: Job.CommandType
+    payload: dict = {}
+
+
 class JobBody(BaseModel):
     external_id: str
-    command_type: str
+    command_type: str | None = None
     selector: dict
-    payload: dict
+    payload: dict = {}
+    # RESTART_SERVICE -> DEPLOY -> PING as one job: each host runs the steps in order under one lock
+    steps: list[JobStep] | None = None
+
+    @model_validator(mode="after")
+    def _first_step_is_command_type(self):
+        if self.steps:
+            if self.command_type is not None and self.command_type != self.steps[0].command_type.value:
+                raise ValueError("command_type must be the first step's command_type")
+            self.command_type = self.steps[0].command_type.value
+        elif self.command_type is None:
+            raise ValueError("command_type or steps is required")
+        return self
+
+    def command_types(self) -> set[str]:
+        if self.steps:
+            return {step.command_type.value for step in self.steps}
+        return {self.command_type}
 
 
 router = APIRouter(tags=['jobs'])
 
 
+def _set_min_lsn(response: Response) -> None:
+    # lets a client that reads right after writing ask for a replica that has replayed the write
+    lsn = write_lsn()
+    if lsn is not None:
+        response.headers["X-Min-Lsn"] = lsn
+
+
 @router.post("/webhook/jobs/")
-async def create_job(job_body: JobBody):
+async def create_job(job_body: JobBody, response: Response):
+    started = time.perf_counter()
     log_event(logger, "webhook_received", service="api",
               external_id=job_body.external_id, command_type=job_body.command_type)
     created_new = False
     with Session.begin() as session:
         job_id = session.execute(select(Job.uid).where(Job.external_id == job_body.external_id)).scalar_one_or_none()
+        if job_id is None:
+            # a redelivered webhook of a job that has been archived since
+            job_id = session.execute(
+                select(ArchivedJob.uid).where(ArchivedJob.external_id == job_body.external_id)
+            ).scalar_one_or_none()
 
         if job_id is None:
-            job_approval_state = Job.ApprovalState.WAIT_APPROVAL if job_body.command_type in REQUIRES_APPROVAL else None
+            requires_approval = bool(job_body.command_types() & REQUIRES_APPROVAL)
+            job_approval_state = Job.ApprovalState.WAIT_APPROVAL if requires_approval else None
+            plan_requested_at = None if job_approval_state else datetime.now(timezone.utc)
             stmt = (
                 insert(Job).values(
-                    **job_body.model_dump() | {'approval_state': job_approval_state}
+                    **job_body.model_dump(mode="json") | {'approval_state': job_approval_state,
+                                                          'plan_requested_at': plan_requested_at}
                 ).returning(Job.uid)
             )
             job_id = session.execute(stmt).scalar_one()
@@ -76,17 +130,19 @@ async def create_job(job_body: JobBody):
 
             session.execute(insert(Execution), rows_execution)
             log_event(logger, "executions_create", service="api", job_id=str(job_id))
-            if job_body.command_type not in REQUIRES_APPROVAL:
+            if not requires_approval:
                 session.execute(insert(Outbox).values(
                     payload={"job_id": str(job_id)},
                 ))
                 log_event(logger, "outbox_event_create", service="api", job_id=str(job_id))
 
+    _set_min_lsn(response)
+    WEBHOOK_DURATION.labels(job_body.command_type, str(created_new).lower()).observe(time.perf_counter() - started)
     return {'job_id': job_id}
 
 
 @router.post("/jobs/{job_id}/approve/")
-async def approve_job(job_id: str):
+async def approve_job(job_id: str, response: Response):
     with Session.begin() as session:
         job = session.get(Job, job_id)
         if not job:
@@ -99,6 +155,7 @@ async def approve_job(job_id: str):
             raise HTTPException(409, f"job not waiting approval (state={job.approval_state})")
 
         job.approval_state = Job.ApprovalState.APPROVED
+        job.plan_requested_at = datetime.now(timezone.utc)
         log_event(logger, "job_approved", service="api", job_id=job_id)
         log_event(logger, "", service="api", job_id=job_id)
         session.add(Outbox(
@@ -108,11 +165,13 @@ async def approve_job(job_id: str):
         ))
         log_event(logger, "outbox_event create", service="api", job_id=job_id)
 
-        return {"job_id": str(job.uid), "approval_state": "APPROVED", "enqueued": True}
+    job_cache.bump(job_id)
+    _set_min_lsn(response)
+    return {"job_id": job_id, "approval_state": "APPROVED", "enqueued": True}
 
 
 @router.post("/jobs/{job_id}/reject/")
-async def reject_job(job_id: str):
+async def reject_job(job_id: str, response: Response):
     with Session.begin() as session:
         job = session.execute(
             select(Job).where(Job.uid == job_id)
@@ -147,6 +206,8 @@ async def reject_job(job_id: str):
             .values(status=Execution.Status.CANCELLED)
         )
         log_event(logger, "job rejected", service="api", job_id=job_id)
+    job_cache.bump(job_id)
+    _set_min_lsn(response)
     return dict(
         job_id=str(job.uid),
         approval_state=job.approval_state.value,
@@ -155,8 +216,8 @@ async def reject_job(job_id: str):
 
 
 @router.get("/jobs/")
-async def get_all_jobs(limit: int = 50, offset: int = 0):
-    with Session.begin() as session:
+async def get_all_jobs(limit: int = 50, offset: int = 0, x_min_lsn: str | None = Header(None)):
+    with read_session(x_min_lsn).begin() as session:
         jobs = session.execute(
             select(Job).order_by(Job.created_at.desc()).limit(limit).offset(offset)
         ).scalars().all()
@@ -173,57 +234,195 @@ async def get_all_jobs(limit: int = 50, offset: int = 0):
     return result
 
 
-@router.get("/jobs/{job_id}/")
-async def get_job(job_id: uuid.UUID):
+def _job_version(job_id: uuid.UUID) -> job_cache.JobVersion | None:
+    # without Redis the endpoints just answer without ETags
+    try:
+        return job_cache.get(str(job_id))
+    except RedisError:
+        return None
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # no "*": the 304 is decided before the job is looked up, so it would be served for ids that do not exist
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _job_not_found(job_id: uuid.UUID, version: job_cache.JobVersion | None) -> HTTPException:
+    if version is not None:
+        try:
+            job_cache.discard(str(job_id))
+        except RedisError:
+            pass
+    return HTTPException(status_code=404, detail="job not found")
+
+
+def _cached_response(job_id: uuid.UUID, version: job_cache.JobVersion | None, name: str,
+                     if_none_match: str | None) -> Response | None:
+    if version is None:
+        return None
+    etag = version.etag(str(job_id))
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if version.final:
+        try:
+            content = job_cache.get_response(str(job_id), version.version, name)
+        except RedisError:
+            content = None
+        if content is not None:
+            return Response(content, media_type="application/json", headers={"ETag": etag})
+    return None
+
+
+def _versioned_response(job_id: uuid.UUID, version: job_cache.JobVersion | None, name: str, body,
+                        final: bool) -> Response:
+    content = orjson.dumps(body)
+    if version is None:
+        return Response(content, media_type="application/json")
+    if final:
+        try:
+            job_cache.put_response(str(job_id), version.version, name, content)
+            job_cache.mark_final(str(job_id), version.version)
+        except RedisError:
+            pass
+    return Response(content, media_type="application/json", headers={"ETag": version.etag(str(job_id))})
+
+
+def _versioned_read_session(version: job_cache.JobVersion | None, x_min_lsn: str | None):
+    # the version is bumped right after commit, so a replica may not have replayed the change yet;
+    # old content must not be served under the new ETag
+    if version is not None and time.time() - version.changed_at < REPLICA_MAX_LAG_SEC + REPLICA_CHECK_INTERVAL_SEC:
+        return Session
+    return read_session(x_min_lsn)
+
+
+def _archived_location(session, job_id: uuid.UUID) -> str | None:
+    return session.execute(select(ArchivedJob.location).where(ArchivedJob.uid == job_id)).scalar_one_or_none()
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: uuid.UUID, response: Response):
+    now = datetime.now(timezone.utc)
+    unfinished = (Execution.Status.NEW, Execution.Status.QUEUED, Execution.Status.RUNNING)
     with Session.begin() as session:
+        # one statement flips the job, and only while it still has work left
+        cancelled = session.execute(
+            update(Job)
+            .where(
+                Job.uid == job_id,
+                Job.status.in_((Job.Status.NEW, Job.Status.QUEUED, Job.Status.RUNNING)),
+                select(Execution.uid)
+                .where(Execution.job_id == Job.uid, Execution.status.in_(unfinished))
+                .exists(),
+            )
+            .values(status=Job.Status.CANCELLED)
+            .returning(Job.uid)
+        ).scalar_one_or_none()
+
+        if cancelled is None:
+            status = session.execute(select(Job.status).where(Job.uid == job_id)).scalar_one_or_none()
+            if status is None:
+                raise HTTPException(status_code=404, detail="job not found")
+            if status == Job.Status.CANCELLED:
+                return {"job_id": str(job_id), "status": status.value, "cancelled_executions": 0}
+            raise HTTPException(status_code=409, detail=f"job has no unfinished executions (status={status.value})")
+
+        # queued messages of these find them CANCELLED; running ones stop at the Redis flag
+        execution_ids = session.execute(
+            update(Execution)
+            .where(
+                Execution.job_id == job_id,
+                Execution.status.in_((Execution.Status.NEW, Execution.Status.QUEUED)),
+            )
+            .values(status=Execution.Status.CANCELLED, finished_at=now, next_attempt_at=None)
+            .returning(Execution.uid)
+        ).scalars().all()
+
+    job_cancel.mark(str(job_id))
+    job_cache.bump(str(job_id))
+    job_events.publish_many(str(job_id), [str(uid) for uid in execution_ids], Execution.Status.CANCELLED.value,
+                            "job cancelled")
+    log_event(logger, "job cancelled", service="api", job_id=str(job_id), count=len(execution_ids))
+    _set_min_lsn(response)
+    return {"job_id": str(job_id), "status": Job.Status.CANCELLED.value, "cancelled_executions": len(execution_ids)}
+
+
+def _job_body(job_id: str, external_id: str, command_type: str, status: str, approval_state: str | None,
+              counts: dict[str, int], steps: list[dict] | None = None) -> dict:
+    total = sum(counts.values())
+
+    done = counts.get(Execution.Status.SUCCESS, 0) \
+           + counts.get(Execution.Status.FAILED, 0) \
+           + counts.get(Execution.Status.CANCELLED, 0) \
+           + counts.get(Execution.Status.TIMEOUT, 0) \
+           + counts.get(Execution.Status.BLOCKED, 0)
+
+    running = counts.get(Execution.Status.RUNNING, 0)
+
+    if total == 0:
+        summary = "EMPTY"
+    elif done == total and status == Job.Status.CANCELLED.value:
+        summary = "CANCELLED"
+    elif done == total and counts.get(Execution.Status.FAILED, 0) == 0 \
+            and counts.get(Execution.Status.BLOCKED, 0) == 0 \
+            and counts.get(Execution.Status.TIMEOUT, 0) == 0:
+        summary = "SUCCESS"
+    elif done == total and counts.get(Execution.Status.SUCCESS, 0) == 0:
+        summary = "FAILED"
+    elif done == total:
+        summary = "PARTIAL"
+    else:
+        if counts.get(Execution.Status.QUEUED, 0) != 0:
+            summary = "QUEUED"
+        else:
+            summary = "RUNNING" if (running > 0) else "NEW"
+
+    return {
+        "job_id": job_id,
+        "external_id": external_id,
+        "command_type": command_type,
+        "steps": [step["command_type"] for step in steps] if steps else None,
+        "status": status,
+        "approval_state": approval_state,
+        "executions_total": total,
+        "executions_by_status": counts,
+        "summary": summary,
+    }
+
+
+@router.get("/jobs/{job_id}/")
+async def get_job(job_id: uuid.UUID, x_min_lsn: str | None = Header(None),
+                  if_none_match: str | None = Header(None)):
+    # the version is read before the queries, so a change racing with them only costs one extra full response
+    version = _job_version(job_id)
+    cached = _cached_response(job_id, version, "job", if_none_match)
+    if cached is not None:
+        return cached
+
+    with _versioned_read_session(version, x_min_lsn).begin() as session:
         job = session.execute(select(Job).where(Job.uid == job_id)).scalars().one_or_none()
 
         if job is None:
-            raise HTTPException(status_code=404, detail="job not found")
+            location = _archived_location(session, job_id)
+            if location is None:
+                raise _job_not_found(job_id, version)
+            job = archive.read_job(location)
+            statuses = Counter(row["status"] for row in archive.read_executions(location))
+            body = _job_body(job["uid"], job["external_id"], job["command_type"], job["status"],
+                             job["approval_state"], dict(statuses), job.get("steps"))
+            return _versioned_response(job_id, version, "job", body, final=True)
 
         rows = session.execute(
             select(Execution.status, func.count(Execution.uid))
             .where(Execution.job_id == job_id)
             .group_by(Execution.status)
         ).all()
+        body = _job_body(str(job.uid), job.external_id, job.command_type.value, job.status.value,
+                         job.approval_state.value if job.approval_state else None,
+                         {status.value: cnt for status, cnt in rows}, job.steps)
 
-        counts = {status.value: cnt for status, cnt in rows}
-        total = sum(counts.values())
-
-        done = counts.get(Execution.Status.SUCCESS, 0) \
-               + counts.get(Execution.Status.FAILED, 0) \
-               + counts.get(Execution.Status.CANCELLED, 0) \
-               + counts.get(Execution.Status.TIMEOUT, 0) \
-               + counts.get(Execution.Status.BLOCKED, 0)
-
-        running = counts.get(Execution.Status.RUNNING, 0)
-
-        if total == 0:
-            summary = "EMPTY"
-        elif done == total and counts.get(Execution.Status.FAILED, 0) == 0 \
-                and counts.get(Execution.Status.BLOCKED, 0) == 0 \
-                and counts.get(Execution.Status.TIMEOUT, 0) == 0:
-            summary = "SUCCESS"
-        elif done == total and counts.get(Execution.Status.SUCCESS, 0) == 0:
-            summary = "FAILED"
-        elif done == total:
-            summary = "PARTIAL"
-        else:
-            if counts.get(Execution.Status.QUEUED, 0) != 0:
-                summary = "QUEUED"
-            else:
-                summary = "RUNNING" if (running > 0) else "NEW"
-
-        return {
-            "job_id": str(job.uid),
-            "external_id": job.external_id,
-            "command_type": job.command_type.value,
-            "status": job.status.value,
-            "approval_state": job.approval_state.value if job.approval_state else None,
-            "executions_total": total,
-            "executions_by_status": counts,
-            "summary": summary,
-        }
+    return _versioned_response(job_id, version, "job", body, final=body["summary"] in ("SUCCESS", "FAILED", "PARTIAL", "CANCELLED"))
 
 
 @router.get("/jobs/{job_id}/executions")
@@ -232,11 +431,45 @@ async def get_job_executions(
         status: Optional[Execution.Status] = None,
         limit: int = Query(50, ge=1, le=500),
         offset: int = Query(0, ge=0),
+        x_min_lsn: str | None = Header(None),
+        if_none_match: str | None = Header(None),
 ):
-    with Session.begin() as session:
+    version = _job_version(job_id)
+    name = f"executions:{status.value if status else ''}:{limit}:{offset}"
+    cached = _cached_response(job_id, version, name, if_none_match)
+    if cached is not None:
+        return cached
+
+    with _versioned_read_session(version, x_min_lsn).begin() as session:
         exists = session.execute(select(Job.uid).where(Job.uid == job_id)).scalar_one_or_none()
         if not exists:
-            raise HTTPException(status_code=404, detail="job not found")
+            location = _archived_location(session, job_id)
+            if location is None:
+                raise _job_not_found(job_id, version)
+            # archived executions are stored sorted by hostname
+            executions = [
+                row for row in archive.read_executions(location)
+                if status is None or row["status"] == status.value
+            ]
+            body = [
+                {
+                    "execution_id": row["uid"],
+                    "host_id": row["host_id"],
+                    "hostname": row["hostname"],
+                    "attempts": row["attempts"],
+                    "step": row.get("step", 0),
+                    "status": row["status"],
+                }
+                for row in executions[offset:offset + limit]
+            ]
+            return _versioned_response(job_id, version, name, body, final=True)
+
+        pending = session.execute(
+            select(Execution.uid).where(
+                Execution.job_id == job_id,
+                Execution.status.not_in(Execution.FINAL_STATUSES),
+            ).limit(1)
+        ).first()
 
         stmt = (
             select(Execution, Host.hostname)
@@ -251,30 +484,193 @@ async def get_job_executions(
             stmt.order_by(Host.hostname.asc()).limit(limit).offset(offset)
         ).all()
 
-        return [
+        body = [
             {
                 "execution_id": str(ex.uid),
                 "host_id": str(ex.host_id),
                 "hostname": hostname,
                 "attempts": ex.attempts,
+                "step": ex.step,
                 "status": ex.status.value,
             }
             for (ex, hostname) in rows
         ]
 
+    return _versioned_response(job_id, version, name, body, final=pending is None)
 
-@router.get('/jobs/executions/{execution_id}/logs')
-async def get_job_execution_logs(execution_id: uuid.UUID):
-    with Session.begin() as session:
-        execution_logs = session.execute(
-            select(ExecutionLogs).where(ExecutionLogs.execution_id == execution_id).order_by(ExecutionLogs.ts.asc())
-        ).scalars().all()
 
-        return [
-            {
-                "execution_id": str(execution_log.execution_id),
-                "ts": execution_log.ts,
-                "line": execution_log.line
-            }
-            for execution_log in execution_logs
-        ]
+@router.get("/jobs/{job_id}/executions/export")
+async def export_job_executions(
+        job_id: uuid.UUID,
+        fmt: Literal["csv", "ndjson", "arrow"] = Query("csv", alias="format"),
+        x_min_lsn: str | None = Header(None),
+):
+    if fmt == "arrow" and job_export.pa is None:
+        raise HTTPException(status_code=501, detail="arrow export needs pyarrow installed")
+
+    session_factory = read_session(x_min_lsn)
+    with session_factory.begin() as session:
+        exists = session.execute(select(Job.uid).where(Job.uid == job_id)).scalar_one_or_none()
+    if not exists:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    # a sync generator: Starlette iterates it in the threadpool, so the cursor fetches never block the loop
+    return StreamingResponse(
+        job_export.export(session_factory, job_id, fmt),
+        media_type=job_export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="job-{job_id}-executions.{fmt}"'},
+    )
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: uuid.UUID, x_min_lsn: str | None = Header(None)):
+    """Server-Sent Events with execution status changes (`status`) and their log lines (`log`).
+
+    `resync` means events were dropped (slow client, Redis reconnect): re-read the job over GET.
+    """
+    with read_session(x_min_lsn).begin() as session:
+        exists = session.execute(select(Job.uid).where(Job.uid == job_id)).scalar_one_or_none()
+    if not exists:
+        raise HTTPException(status_code=404, detail="job not found")
+
+    watcher = await job_events.hub.watch(str(job_id))
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(watcher.ready.wait(), JOB_EVENTS_HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                # let a burst pile up so it is coalesced and written at once
+                await asyncio.sleep(JOB_EVENTS_FLUSH_SEC)
+                yield watcher.drain()
+        finally:
+            job_events.hub.unwatch(str(job_id), watcher)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _seconds(end, start):
+    return func.extract('epoch', end - start)
+
+
+EXECUTION_PHASES = {
+    "planning": lambda: _seconds(Execution.queued_at, Job.plan_published_at),
+    "dispatch": lambda: _seconds(Execution.dispatched_at, Execution.queued_at),
+    "queue_wait": lambda: _seconds(Execution.lock_acquired_at, Execution.dispatched_at),
+    "backoff": lambda: Execution.backoff_seconds,
+    "agent": lambda: _seconds(Execution.agent_finished_at, Execution.agent_started_at),
+    "total": lambda: _seconds(Execution.finished_at, Execution.created_at),
+}
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+@router.get("/jobs/{job_id}/timings")
+async def get_job_timings(job_id: uuid.UUID, x_min_lsn: str | None = Header(None)):
+    with read_session(x_min_lsn).begin() as session:
+        job = session.execute(select(Job).where(Job.uid == job_id)).scalars().one_or_none()
+        if job is None:
+            raise HTTPException(status_code=404, detail="job not found")
+
+        columns = [func.count(Execution.uid).label("executions")]
+        for phase, expr in EXECUTION_PHASES.items():
+            columns.append(func.count(expr()).label(f"{phase}__count"))
+            columns.extend(
+                func.percentile_cont(literal(q)).within_group(expr()).label(f"{phase}__{name}")
+                for name, q in PERCENTILES.items()
+            )
+
+        row = session.execute(
+            select(*columns)
+            .select_from(Execution)
+            .join(Job, Job.uid == Execution.job_id)
+            .where(Execution.job_id == job_id)
+        ).mappings().one()
+
+        phases: dict[str, dict] = {}
+        for key, value in row.items():
+            if "__" not in key:
+                continue
+            phase, stat = key.split("__")
+            if stat == "count":
+                phases.setdefault(phase, {})[stat] = value
+            else:
+                phases.setdefault(phase, {})[stat] = round(float(value), 4) if value is not None else None
+
+        def delta(end, start):
+            return (end - start).total_seconds() if end and start else None
+
+        return {
+            "job_id": str(job.uid),
+            "executions": row["executions"],
+            "approval_wait": delta(job.plan_requested_at, job.created_at),
+            "outbox_delay": delta(job.plan_published_at, job.plan_requested_at),
+            "phases": phases,
+        }
+
+
+def _log_range(rows: Iterable[dict], start: int, limit: int | None, tail: int | None) -> list:
+    # rows may be read lazily from the archive: only the requested ones are kept
+    if tail is not None:
+        return list(deque(rows, maxlen=tail))
+    return list(itertools.islice(rows, start, start + limit if limit is not None else None))
+
+
+@router.get('/jobs/executions/{execution_id}/logs')
+async def get_job_execution_logs(
+        execution_id: uuid.UUID,
+        source: Literal["events", "output"] = "events",
+        start: int = Query(0, ge=0),
+        limit: Optional[int] = Query(None, ge=1),
+        tail: Optional[int] = Query(None, ge=1),
+        x_min_lsn: str | None = Header(None),
+):
+    """`events` are the orchestrator's lines (retries, timeouts, call result), `output` is what the agent printed.
+
+    `start`/`limit` select a range of lines, `tail` the last N lines.
+    """
+    with read_session(x_min_lsn).begin() as session:
+        if source == "output":
+            if tail is not None:
+                lines = log_chunks.tail(session, execution_id, tail)
+            else:
+                lines = log_chunks.read(session, execution_id, start, limit)
+            rows = [{"execution_id": str(execution_id)} | line for line in lines]
+        else:
+            stmt = select(ExecutionLogs).where(ExecutionLogs.execution_id == execution_id)
+            if tail is not None:
+                stmt = stmt.order_by(ExecutionLogs.ts.desc()).limit(tail)
+            else:
+                stmt = stmt.order_by(ExecutionLogs.ts.asc()).offset(start).limit(limit)
+            execution_logs = session.execute(stmt).scalars().all()
+            if tail is not None:
+                execution_logs.reverse()
+            rows = [
+                {
+                    "execution_id": str(execution_log.execution_id),
+                    "ts": execution_log.ts,
+                    "line": execution_log.line
+                }
+                for execution_log in execution_logs
+            ]
+        if rows:
+            return rows
+
+        location = session.execute(
+            select(ArchivedJob.location)
+            .join(ArchivedExecution, ArchivedExecution.job_id == ArchivedJob.uid)
+            .where(ArchivedExecution.uid == execution_id)
+        ).scalar_one_or_none()
+        if location is None:
+            return []
+
+    if source == "output":
+        return _log_range(archive.read_output(location, execution_id), start, limit, tail)
+    return [
+        {"execution_id": row["execution_id"], "ts": row["ts"], "line": row["line"]}
+        for row in _log_range(archive.read_logs(location, execution_id), start, limit, tail)
+    ]
@@ -0,0 +1,69 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from pydantic import BaseModel, Field
+
+from db.db import Session
+from metrics import build_registry, render
+import profiling
+import queue_state
+
+from config import PROFILE_DIR, PROFILE_INTERVAL_SEC, PROFILE_REFRESH_SEC
+
+router = APIRouter(tags=['system'])
+
+registry = build_registry(with_db_state=True)
+
+
+@router.get("/metrics")
+def get_metrics():
+    return Response(render(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/system/queues")
+def get_queues():
+    with Session() as session:
+        executions = queue_state.execution_counts(session)
+        outbox = queue_state.outbox_backlog(session)
+    pools = queue_state.pools()
+    processes = sum(pool["processes"] for pool in pools)
+    busy = sum(pool["busy"] for pool in pools)
+    return {
+        "broker": queue_state.broker_depth(),
+        "executions": executions,
+        "outbox": outbox,
+        # workers started with --autoscale report their pool every AUTOSCALE_INTERVAL_SEC
+        "workers": pools,
+        "pool": {
+            "processes": processes,
+            "busy": busy,
+            "utilization": round(busy / processes, 3) if processes else None,
+        },
+    }
+
+
+class ProfilingBody(BaseModel):
+    # task name or "METHOD /route/template" -> share of calls profiled; null restores PROFILE_TARGETS
+    targets: dict[str, Annotated[float, Field(ge=0, le=1)]] | None
+
+
+def _profiling() -> dict:
+    return {
+        "targets": profiling.targets(),
+        # profiles are written on the host of the process that ran the task or request
+        "dir": PROFILE_DIR,
+        "interval_sec": PROFILE_INTERVAL_SEC,
+        "refresh_sec": PROFILE_REFRESH_SEC,
+    }
+
+
+@router.get("/system/profiling")
+def get_profiling():
+    return _profiling()
+
+
+@router.put("/system/profiling")
+def put_profiling(body: ProfilingBody):
+    profiling.set_targets(body.targets)
+    return _profiling()
@@ -0,0 +1,41 @@
+import heapq
+import itertools
+from typing import Callable
+
+
+class VirtualClock:
+    """Simulated time that only moves when the next scheduled event is run.
+
+    Events at the same instant run in the order they were scheduled, so a run is fully determined
+    by the events and the random source of the simulation.
+    """
+
+    def __init__(self):
+        self._now = 0.0
+        self._events: list[tuple[float, int, Callable, tuple]] = []
+        self._seq = itertools.count()
+        self.processed = 0
+
+    def time(self) -> float:
+        """Seconds since the start of the simulation."""
+        return self._now
+
+    def call_at(self, at: float, fn: Callable, *args) -> None:
+        heapq.heappush(self._events, (max(at, self._now), next(self._seq), fn, args))
+
+    def call_later(self, delay: float, fn: Callable, *args) -> None:
+        self.call_at(self._now + delay, fn, *args)
+
+    def run(self, until: Callable[[], bool] | None = None, limit: float | None = None) -> None:
+        """Runs events in time order until there are none left, `until()` holds or the clock passes `limit`."""
+        while self._events:
+            if until is not None and until():
+                return
+            at, _, fn, args = self._events[0]
+            if limit is not None and at > limit:
+                self._now = limit
+                return
+            heapq.heappop(self._events)
+            self._now = at
+            self.processed += 1
+            fn(*args)
@@ -0,0 +1,268 @@
+import heapq
+import random
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from agent import AgentModel, SUCCESS, TIMEOUT
+from db.models import Execution
+from sim.clock import VirtualClock
+from worker.tasks.run_execution import backoff_seconds
+
+from config import MAX_RETRIES, BASE_BACKOFF, MAX_BACKOFF, RETRY_SCHEDULER_INTERVAL, RETRY_SCHEDULER_BATCH
+from config import PLAN_BATCH, PLAN_SHARDS, PLAN_SHARD_MIN_EXECUTIONS
+
+# publish_outbox batch size and its beat schedule (worker/celery_app.py)
+OUTBOX_BATCH = 200
+OUTBOX_INTERVAL = 2.0
+
+
+@dataclass
+class Params:
+    hosts: int = 1000
+    jobs: int = 1
+    # seconds between webhooks; every job targets the whole fleet, so overlapping jobs contend for host locks
+    job_interval: float = 0.0
+    # prefork processes consuming the default queue
+    workers: int = 8
+    max_retries: int = MAX_RETRIES
+    base_backoff: float = BASE_BACKOFF
+    max_backoff: float = MAX_BACKOFF
+    plan_batch: int = PLAN_BATCH
+    plan_shards: int = PLAN_SHARDS
+    plan_shard_min: int = PLAN_SHARD_MIN_EXECUTIONS
+    retry_interval: float = RETRY_SCHEDULER_INTERVAL
+    retry_batch: int = RETRY_SCHEDULER_BATCH
+    # worker time outside agent calls: a run_execution without the call, one claim transaction
+    # (plan_job, plan_shard, schedule_retries, publish_outbox) and one send_task
+    task_sec: float = 0.005
+    batch_sec: float = 0.02
+    publish_sec: float = 0.001
+    agent: AgentModel = field(default_factory=AgentModel)
+    # share of hosts whose agent follows `slow_agent` instead of `agent`
+    slow_rate: float = 0.0
+    slow_agent: AgentModel | None = None
+    seed: int = 0
+
+
+class _Job:
+    __slots__ = ("n", "created_at", "executions", "dispatched", "first_dispatch_at", "dispatched_at",
+                 "pending", "finished_at")
+
+    def __init__(self, n: int, created_at: float):
+        self.n = n
+        self.created_at = created_at
+        self.executions: list[int] = []
+        self.dispatched = 0
+        self.first_dispatch_at: float | None = None
+        self.dispatched_at: float | None = None
+        self.pending = 0
+        self.finished_at: float | None = None
+
+
+class _Execution:
+    __slots__ = ("job", "host", "status", "retries", "attempts", "next_attempt_at", "finished_at")
+
+    def __init__(self, job: _Job, host: int):
+        self.job = job
+        self.host = host
+        self.status = Execution.Status.NEW
+        self.retries = 0
+        self.attempts = 0
+        self.next_attempt_at: float | None = None
+        self.finished_at: float | None = None
+
+
+class Simulation:
+    """create_job → publish_outbox → plan_job / plan_shard → run_execution ⇄ schedule_retries on a virtual clock.
+
+    The tasks are modelled by their effect on execution state and the worker time they hold: one
+    FIFO queue served by `workers` slots, beat sending publish_outbox and schedule_retries to the same
+    queue, one agent call per host at a time (the advisory lock), retries parked until due. Backoff
+    and agent outcomes come from the same functions the worker uses, drawn from the injected `rng`.
+    """
+
+    def __init__(self, params: Params, clock: VirtualClock | None = None, rng: random.Random | None = None):
+        self.p = params
+        self.clock = clock or VirtualClock()
+        self.rng = rng or random.Random(params.seed)
+
+        slow_agent = params.slow_agent or params.agent
+        self.host_ids = [str(uuid.UUID(int=self.rng.getrandbits(128), version=4)) for _ in range(params.hosts)]
+        self.host_agents = [
+            slow_agent if self.rng.random() < params.slow_rate else params.agent for _ in range(params.hosts)
+        ]
+
+        self.jobs: list[_Job] = []
+        self.executions: list[_Execution] = []
+        self.outbox: deque[_Job] = deque()
+        self.broker: deque[tuple] = deque()
+        self.parked: list[tuple[float, int]] = []
+        self.host_locks: set[int] = set()
+        self.idle = params.workers
+        self.busy_sec = 0.0
+        self.pending = 0
+        self.retries: Counter[str] = Counter()
+        self._pumping = False
+
+    def run(self, limit: float | None = None) -> "Simulation":
+        for n in range(self.p.jobs):
+            self.clock.call_at(n * self.p.job_interval, self._create_job, n)
+        self.clock.call_at(0.0, self._beat, OUTBOX_INTERVAL, "publish_outbox")
+        self.clock.call_at(0.0, self._beat, self.p.retry_interval, "schedule_retries")
+        self.clock.run(until=lambda: len(self.jobs) == self.p.jobs and self.pending == 0, limit=limit)
+        return self
+
+    # broker and workers
+
+    def _beat(self, interval: float, task: str) -> None:
+        self._send(task)
+        self.clock.call_later(interval, self._beat, interval, task)
+
+    def _send(self, task: str, *args) -> None:
+        self.broker.append((task, args))
+        self._pump()
+
+    def _pump(self) -> None:
+        # a task started here may send more tasks; they are picked up by this same loop
+        if self._pumping:
+            return
+        self._pumping = True
+        while self.idle and self.broker:
+            task, args = self.broker.popleft()
+            self.idle -= 1
+            getattr(self, f"_{task}")(self.clock.time(), *args)
+        self._pumping = False
+
+    def _done(self, started: float) -> None:
+        self.idle += 1
+        self.busy_sec += self.clock.time() - started
+        self._pump()
+
+    # webhook and tasks
+
+    def _create_job(self, n: int) -> None:
+        job = _Job(n, self.clock.time())
+        for host in range(self.p.hosts):
+            job.executions.append(len(self.executions))
+            self.executions.append(_Execution(job, host))
+        job.pending = self.p.hosts
+        self.pending += self.p.hosts
+        self.jobs.append(job)
+        self.outbox.append(job)
+
+    def _publish_outbox(self, started: float) -> None:
+        jobs = [self.outbox.popleft() for _ in range(min(OUTBOX_BATCH, len(self.outbox)))]
+        self.clock.call_later(self.p.batch_sec + self.p.publish_sec * len(jobs), self._outbox_sent, jobs, started)
+
+    def _outbox_sent(self, jobs: list[_Job], started: float) -> None:
+        for job in jobs:
+            self._send("plan_job", job)
+        self._done(started)
+
+    def _plan_job(self, started: float, job: _Job) -> None:
+        total = len(job.executions)
+        if self.p.plan_shards > 1 and total >= self.p.plan_shard_min:
+            # uid ranges of uuid4 executions hold about the same number of executions each
+            bounds = [total * i // self.p.plan_shards for i in range(self.p.plan_shards + 1)]
+            self.clock.call_later(self.p.batch_sec, self._sharded, job, bounds, started)
+            return
+        self._plan_batch(started, job, 0, total)
+
+    def _sharded(self, job: _Job, bounds: list[int], started: float) -> None:
+        for lo, hi in zip(bounds, bounds[1:]):
+            self._send("plan_shard", job, lo, hi)
+        self._done(started)
+
+    def _plan_shard(self, started: float, job: _Job, lo: int, hi: int) -> None:
+        self._plan_batch(started, job, lo, hi)
+
+    def _plan_batch(self, started: float, job: _Job, lo: int, hi: int) -> None:
+        ids = job.executions[lo:min(hi, lo + self.p.plan_batch)]
+        if not ids:
+            self._done(started)
+            return
+        for idx in ids:
+            self.executions[idx].status = Execution.Status.QUEUED
+        cost = self.p.batch_sec + self.p.publish_sec * len(ids)
+        self.clock.call_later(cost, self._dispatched, job, ids, lo + len(ids), hi, started)
+
+    def _dispatched(self, job: _Job, ids: list[int], lo: int, hi: int, started: float) -> None:
+        for idx in ids:
+            self._send("run_execution", idx)
+        now = self.clock.time()
+        if job.first_dispatch_at is None:
+            job.first_dispatch_at = now
+        job.dispatched += len(ids)
+        if job.dispatched == len(job.executions):
+            job.dispatched_at = now
+        self._plan_batch(started, job, lo, hi)
+
+    def _run_execution(self, started: float, idx: int) -> None:
+        e = self.executions[idx]
+        if e.status != Execution.Status.QUEUED or e.next_attempt_at is not None:
+            self.clock.call_later(self.p.task_sec, self._done, started)
+            return
+        if e.host in self.host_locks:
+            self.clock.call_later(self.p.task_sec, self._host_locked, idx, started)
+            return
+        self.host_locks.add(e.host)
+        e.status = Execution.Status.RUNNING
+        e.attempts += 1
+        outcome, seconds = self.host_agents[e.host].outcome(self.host_ids[e.host], self.rng)
+        self.clock.call_later(self.p.task_sec + seconds, self._agent_returned, idx, outcome, started)
+
+    def _host_locked(self, idx: int, started: float) -> None:
+        self._retry_or_finish(idx, is_timeout=False, reason="host_locked")
+        self._done(started)
+
+    def _agent_returned(self, idx: int, outcome: str, started: float) -> None:
+        e = self.executions[idx]
+        self.host_locks.discard(e.host)
+        if outcome == SUCCESS:
+            self._finish(e, Execution.Status.SUCCESS)
+        else:
+            self._retry_or_finish(idx, is_timeout=outcome == TIMEOUT, reason=outcome)
+        self._done(started)
+
+    def _retry_or_finish(self, idx: int, is_timeout: bool, reason: str) -> None:
+        e = self.executions[idx]
+        if e.retries < self.p.max_retries:
+            delay = backoff_seconds(e.retries, self.p.base_backoff, self.p.max_backoff, self.rng)
+            e.retries += 1
+            e.status = Execution.Status.QUEUED
+            e.next_attempt_at = self.clock.time() + delay
+            heapq.heappush(self.parked, (e.next_attempt_at, idx))
+            self.retries[reason] += 1
+            return
+        self._finish(e, Execution.Status.TIMEOUT if is_timeout else Execution.Status.FAILED)
+
+    def _finish(self, e: _Execution, status: Execution.Status) -> None:
+        now = self.clock.time()
+        e.status = status
+        e.finished_at = now
+        self.pending -= 1
+        e.job.pending -= 1
+        if e.job.pending == 0:
+            e.job.finished_at = now
+
+    def _schedule_retries(self, started: float) -> None:
+        now = self.clock.time()
+        due = []
+        while self.parked and self.parked[0][0] <= now and len(due) < self.p.retry_batch:
+            due.append(heapq.heappop(self.parked)[1])
+        if not due:
+            self.clock.call_later(self.p.batch_sec, self._done, started)
+            return
+        for idx in due:
+            self.executions[idx].next_attempt_at = None
+        cost = self.p.batch_sec + self.p.publish_sec * len(due)
+        self.clock.call_later(cost, self._retries_sent, due, started)
+
+    def _retries_sent(self, due: list[int], started: float) -> None:
+        for idx in due:
+            self._send("run_execution", idx)
+        if len(due) < self.p.retry_batch:
+            self._done(started)
+            return
+        self._schedule_retries(started)
@@ -0,0 +1,88 @@
+import logging
+import math
+import socket
+from time import monotonic
+
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+
+from log.utils import log_event
+import queue_state
+
+from config import AUTOSCALE_DRAIN_SEC, AUTOSCALE_INTERVAL, AUTOSCALE_TASK_SEC
+
+logger = logging.getLogger('worker autoscale')
+
+
+class BacklogAutoscaler(Autoscaler):
+    """Sizes the prefork pool from the broker backlog instead of the messages this worker has prefetched.
+
+    Every AUTOSCALE_INTERVAL the target becomes the busy processes plus enough processes to drain this
+    worker's share of the backlog (queued messages split across the workers reporting to Redis, plus
+    its own prefetched ones) within AUTOSCALE_DRAIN_SEC, at the task duration the pool has shown:
+    busy processes / tasks accepted per second (Little's law), which for run_execution is mostly the
+    agent call. The target stays within --autoscale=MAX,MIN; scaling down waits for the keepalive
+    after the last scale-up, as in the stock autoscaler.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hostname = self.worker.hostname if self.worker is not None else socket.gethostname()
+        self.task_sec = AUTOSCALE_TASK_SEC
+        self.target = self.min_concurrency
+        self._checked_at: float | None = None
+        self._accepted = state.all_total_count[0]
+        self._busy = 0
+        self._workers = 1
+
+    def _maybe_scale(self, req=None):
+        now = monotonic()
+        if self._checked_at is None or now - self._checked_at >= AUTOSCALE_INTERVAL:
+            self._update_target(now)
+
+        procs = self.processes
+        if self.target > procs:
+            self.scale_up(self.target - procs)
+            return True
+        if self.target < procs:
+            self.scale_down(procs - self.target)
+            return True
+
+    def _update_target(self, now: float) -> None:
+        busy = len(state.active_requests)
+        accepted = state.all_total_count[0]
+        if self._checked_at is not None and accepted > self._accepted:
+            rate = (accepted - self._accepted) / (now - self._checked_at)
+            measured = (self._busy + busy) / 2 / rate
+            # smoothed, so a burst of instant no-op tasks does not collapse the estimate
+            self.task_sec = 0.5 * self.task_sec + 0.5 * measured
+        self._checked_at, self._accepted, self._busy = now, accepted, busy
+
+        reserved = len(state.reserved_requests)
+        try:
+            waiting = sum(queue_state.broker_depth()["queues"].values())
+        except Exception as e:
+            # without the broker's view the pool keeps its size
+            log_event(logger, 'autoscale signals unavailable', error_type=type(e).__name__, error_msg=str(e))
+            return
+
+        # split by the workers that reported last time; this one is among them
+        backlog = waiting / self._workers + max(0, reserved - busy)
+        target = busy + math.ceil(backlog * self.task_sec / AUTOSCALE_DRAIN_SEC)
+        target = max(self.min_concurrency, min(self.max_concurrency, target))
+        if target != self.target:
+            log_event(logger, 'autoscale target', processes=self.processes, target=target,
+                      backlog=round(backlog), duration_ms=round(self.task_sec * 1000, 1))
+            self.target = target
+
+        try:
+            self._workers = max(1, queue_state.publish_pool(self.hostname, {
+                "processes": self.processes, "busy": busy, "reserved": reserved,
+                "min": self.min_concurrency, "max": self.max_concurrency, "target": self.target,
+                "task_sec": self.task_sec,
+            }))
+        except Exception as e:
+            log_event(logger, 'autoscale signals unavailable', error_type=type(e).__name__, error_msg=str(e))
+
+    def info(self):
+        return super().info() | {"target": self.target, "task_sec": round(self.task_sec, 3)}
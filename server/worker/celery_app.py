@@ -1,10 +1,16 @@
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from celery.signals import task_prerun, task_postrun, before_task_publish, after_task_publish
 from kombu import Queue
 
-from config import REDIS_URL, TASK_PUBLISH_OUTBOX
+from config import REDIS_URL, TASK_PUBLISH_OUTBOX, TASK_SCHEDULE_RETRIES, RETRY_SCHEDULER_INTERVAL, WORKER_METRICS_PORT
+from config import TASK_REAP_EXECUTIONS, REAPER_INTERVAL, TASK_ARCHIVE_JOBS, ARCHIVE_INTERVAL, TASK_QUEUE
+from metrics import start_worker_metrics_server, mark_worker_process_dead
+from worker.autoscale import BacklogAutoscaler
+import profiling
 
-from log.conf import setup_logging
+from log.conf import setup_logging, restart_listener
 setup_logging()
 
 celery_app = Celery(
@@ -14,6 +20,10 @@ celery_app = Celery(
         "worker.tasks.publish_outbox",
         "worker.tasks.run_execution",
         "worker.tasks.plan_job",
+        "worker.tasks.plan_shard",
+        "worker.tasks.schedule_retries",
+        "worker.tasks.reap_executions",
+        "worker.tasks.archive_jobs",
     ],
 )
 
@@ -25,6 +35,10 @@ celery_app.conf.update(
     task_acks_late=True,
     task_reject_on_worker_lost=True,
     worker_prefetch_multiplier=1,
+    worker_hijack_root_logger=False,
+    # only used with --autoscale=MAX,MIN; the class itself, because the worker resolves a dotted path
+    # after the celery CLI has taken the working directory off sys.path again
+    worker_autoscaler=BacklogAutoscaler,
 
     broker_connection_retry_on_startup=True,
     broker_transport_options={
@@ -37,8 +51,56 @@ celery_app.conf.beat_schedule = {
     "publish-outbox-every-2s": {
         "task": TASK_PUBLISH_OUTBOX,
         "schedule": 2.0,
-    }
+    },
+    "schedule-retries": {
+        "task": TASK_SCHEDULE_RETRIES,
+        "schedule": RETRY_SCHEDULER_INTERVAL,
+    },
+    "reap-executions": {
+        "task": TASK_REAP_EXECUTIONS,
+        "schedule": REAPER_INTERVAL,
+    },
+    "archive-jobs": {
+        "task": TASK_ARCHIVE_JOBS,
+        "schedule": ARCHIVE_INTERVAL,
+    },
 }
 
-celery_app.conf.task_queues = (Queue("default"),)
-celery_app.conf.task_default_queue = "default"
+celery_app.conf.task_queues = (Queue(TASK_QUEUE),)
+celery_app.conf.task_default_queue = TASK_QUEUE
+
+
+@worker_init.connect
+def _start_metrics_server(**kwargs):
+    start_worker_metrics_server(WORKER_METRICS_PORT)
+
+
+@worker_process_init.connect
+def _restart_log_listener(**kwargs):
+    # the QueueListener thread does not survive the prefork fork
+    restart_listener()
+
+
+@worker_process_shutdown.connect
+def _mark_process_dead(pid=None, **kwargs):
+    mark_worker_process_dead(pid)
+
+
+@task_prerun.connect
+def _start_profile(task=None, **kwargs):
+    profiling.start(task.name)
+
+
+@task_postrun.connect
+def _stop_profile(**kwargs):
+    profiling.stop()
+
+
+@before_task_publish.connect
+def _publish_started(**kwargs):
+    profiling.begin_phase("broker")
+
+
+@after_task_publish.connect
+def _publish_finished(**kwargs):
+    profiling.end_phase("broker")
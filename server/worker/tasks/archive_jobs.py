@@ -0,0 +1,96 @@
+import logging
+from datetime import datetime, timezone, timedelta
+from dataclasses import asdict
+
+from sqlalchemy import select, insert, delete, exists, or_
+
+from worker.celery_app import celery_app
+from db.db import Session
+from db.models import Job, Execution, ExecutionLogs, ArchivedJob, ArchivedExecution
+from log.utils import log_event
+import archive
+
+from config import TASK_ARCHIVE_JOBS, ARCHIVE_URL, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_JOBS
+
+logger = logging.getLogger('worker archive_jobs')
+
+
+def _candidate(cutoff: datetime, failed: list):
+    # finished long enough ago: nothing left to run and nothing finished after the cutoff
+    active = exists().where(
+        Execution.job_id == Job.uid,
+        or_(Execution.status.not_in(Execution.FINAL_STATUSES), Execution.finished_at >= cutoff),
+    )
+    return (
+        select(Job.uid, Job.external_id)
+        .where(Job.created_at < cutoff, ~active, Job.uid.not_in(failed))
+        .order_by(Job.created_at.asc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _archive_one(cutoff: datetime, failed: list) -> dict | None:
+    """Archives the oldest eligible job not in `failed`; a job that fails is appended to it."""
+    with Session.begin() as session:
+        row = session.execute(_candidate(cutoff, failed)).first()
+        if row is None:
+            return None
+        job_id, external_id = row
+
+        try:
+            # files first: if the upload fails the transaction rolls back and the job stays in Postgres
+            location, files = archive.write_job(session, job_id)
+
+            session.execute(insert(ArchivedJob).values(uid=job_id, external_id=external_id, location=location))
+            job_executions = select(Execution.uid).where(Execution.job_id == job_id)
+            session.execute(
+                insert(ArchivedExecution).from_select(
+                    ["uid", "job_id"], select(Execution.uid, Execution.job_id).where(Execution.job_id == job_id)
+                )
+            )
+            session.execute(delete(ExecutionLogs).where(ExecutionLogs.execution_id.in_(job_executions)))
+            session.execute(delete(Execution).where(Execution.job_id == job_id))
+            session.execute(delete(Job).where(Job.uid == job_id))
+        except Exception:
+            failed.append(job_id)
+            # the job row is still locked, so no other run is writing these files meanwhile
+            archive.delete_job(job_id)
+            raise
+
+    return {"job_id": str(job_id), "location": location, "files": [asdict(f) for f in files]}
+
+
+@celery_app.task(name=TASK_ARCHIVE_JOBS)
+def archive_jobs(batch_size: int = ARCHIVE_BATCH_JOBS) -> None:
+    if not ARCHIVE_URL:
+        return
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+    # one transaction per job keeps locks and the server-side cursors short
+    archived = []
+    # jobs that failed in this run are passed over, so one bad job does not hold back the ones after it
+    failed = []
+    for _ in range(batch_size):
+        failures = len(failed)
+        try:
+            job = _archive_one(cutoff, failed)
+        except Exception as e:
+            if len(failed) == failures:
+                # not a job's fault (the database itself): the next one would fail the same way
+                log_event(logger, 'job archive failed', error_type=type(e).__name__, error_msg=str(e))
+                break
+            log_event(logger, 'job archive failed', job_id=str(failed[-1]),
+                      error_type=type(e).__name__, error_msg=str(e))
+            continue
+        if job is None:
+            break
+        archived.append(job)
+
+    if not archived:
+        return
+    # archived_jobs is the source of truth for reads; the manifest is the inventory of the archive itself
+    manifest = archive.write_manifest(archived)
+    log_event(logger, 'jobs archived', count=len(archived), manifest=manifest,
+              rows=sum(f["rows"] for job in archived for f in job["files"]),
+              bytes=sum(f["bytes"] for job in archived for f in job["files"]))
@@ -1,21 +1,77 @@
 import logging
+import time
+import uuid
 from datetime import datetime, timezone
 
 from worker.celery_app import celery_app
-from config import TASK_PLAN_JOB
+from config import TASK_PLAN_JOB, TASK_PLAN_SHARD
 
-from sqlalchemy import select, update
+from sqlalchemy import select, update, insert, func
 from db.db import Session
-from db.models import Job, Execution
+from db.models import Job, Execution, PlanShard
 
-from config import TASK_RUN_EXECUTION
+from config import TASK_RUN_EXECUTION, PLAN_BATCH, PLAN_SHARDS, PLAN_SHARD_MIN_EXECUTIONS
 from log.utils import log_event
+from metrics import PLAN_BATCH_DURATION, PLAN_BATCH_SIZE, BROKER_PUBLISHES
+import job_cache
+import job_events
 
 logger = logging.getLogger('worker plan_job')
 
 
+def shard_bounds(shards: int) -> list[tuple[uuid.UUID | None, uuid.UUID | None]]:
+    # execution ids are uuid4, so equal slices of the uid space hold about the same number of executions
+    edges = [uuid.UUID(int=(i << 128) // shards) for i in range(1, shards)]
+    return list(zip([None] + edges, edges + [None]))
+
+
+def claim_batch(session, job_id: str, batch_size: int, uid_from=None, uid_to=None, after=None) -> list[uuid.UUID]:
+    """Moves the next NEW executions of the job (optionally of a uid range, past `after`) to QUEUED."""
+    stmt = select(Execution.uid).where(
+        Execution.job_id == job_id,
+        Execution.status == Execution.Status.NEW,
+    )
+    if uid_from is not None:
+        stmt = stmt.where(Execution.uid >= uid_from)
+    if uid_to is not None:
+        stmt = stmt.where(Execution.uid < uid_to)
+    if after is not None:
+        stmt = stmt.where(Execution.uid > after)
+    ids = session.execute(
+        stmt.order_by(Execution.uid.asc()).with_for_update(skip_locked=True).limit(batch_size)
+    ).scalars().all()
+
+    if ids:
+        session.execute(
+            update(Execution)
+            .where(
+                Execution.uid.in_(ids),
+                Execution.status == Execution.Status.NEW,
+            )
+            .values(status=Execution.Status.QUEUED, queued_at=datetime.now(timezone.utc))
+        )
+    return ids
+
+
+def dispatch(job_id: str, ids: list[uuid.UUID]) -> None:
+    """Publishes run_execution for queued executions, then records when they were handed to the broker."""
+    execution_ids = [str(x) for x in ids]
+    job_cache.bump(job_id)
+    job_events.publish_many(job_id, execution_ids, Execution.Status.QUEUED.value)
+    for execution_id in execution_ids:
+        celery_app.send_task(TASK_RUN_EXECUTION, args=[execution_id])
+    with Session.begin() as session:
+        session.execute(
+            update(Execution)
+            .where(Execution.uid.in_(ids))
+            .values(dispatched_at=datetime.now(timezone.utc))
+        )
+    BROKER_PUBLISHES.labels(TASK_RUN_EXECUTION).inc(len(execution_ids))
+
+
 @celery_app.task(name=TASK_PLAN_JOB)
-def plan_job(job_id: str, batch_size: int = 200) -> None:
+def plan_job(job_id: str, batch_size: int = PLAN_BATCH, shards: int | None = None) -> None:
+    shard_ids: list[str] = []
     with Session.begin() as session:
         job = session.execute(
             select(Job).where(
@@ -35,35 +91,50 @@ def plan_job(job_id: str, batch_size: int = 200) -> None:
             .values(status=Job.Status.QUEUED)
         )
         log_event(logger, 'job queued', job_id=job_id, command_type=job.command_type)
+
+        shards = PLAN_SHARDS if shards is None else shards
+        if shards > 1:
+            total = session.execute(
+                select(func.count(Execution.uid))
+                .where(Execution.job_id == job_id, Execution.status == Execution.Status.NEW)
+            ).scalar_one()
+            if total >= PLAN_SHARD_MIN_EXECUTIONS:
+                # created in the same transaction as the QUEUED job: a redelivered plan_job finds
+                # the job already queued, and shards whose task never arrives are re-sent by reap_executions
+                shard_ids = [
+                    str(uid) for uid in session.execute(
+                        insert(PlanShard).returning(PlanShard.uid),
+                        [
+                            {"job_id": job_id, "shard": n, "uid_from": uid_from, "uid_to": uid_to}
+                            for n, (uid_from, uid_to) in enumerate(shard_bounds(shards))
+                        ],
+                    ).scalars()
+                ]
+                log_event(logger, 'job sharded', job_id=job_id, executions=total, shards=shards)
+    job_cache.bump(job_id)
+
+    if shard_ids:
+        for shard_id in shard_ids:
+            celery_app.send_task(TASK_PLAN_SHARD, args=[shard_id], kwargs={"batch_size": batch_size})
+        BROKER_PUBLISHES.labels(TASK_PLAN_SHARD).inc(len(shard_ids))
+        return
+
+    started = time.perf_counter()
+    dispatched = 0
     while True:
+        batch_started = time.perf_counter()
         with Session.begin() as session:
-            ids = (
-                session.execute(
-                    select(Execution.uid)
-                    .where(
-                        Execution.job_id == job_id,
-                        Execution.status == Execution.Status.NEW,
-                    )
-                    .with_for_update(skip_locked=True)
-                    .limit(batch_size)
-                )
-                .scalars()
-                .all()
-            )
+            ids = claim_batch(session, job_id, batch_size)
 
-            if not ids:
-                break
+        if not ids:
+            break
 
-            session.execute(
-                update(Execution)
-                .where(
-                    Execution.uid.in_(ids),
-                    Execution.status == Execution.Status.NEW,
-                )
-                .values(status=Execution.Status.QUEUED)
-            )
-            execution_ids = [str(x) for x in ids]
-            log_event(logger, 'executions queued', job_id=job_id)
-        for execution_id in execution_ids:
-            celery_app.send_task(TASK_RUN_EXECUTION, args=[execution_id])
-            log_event(logger, 'send task_run_execution', job_id=job_id, execution_id=execution_id)
+        dispatch(job_id, ids)
+        dispatched += len(ids)
+        batch_sec = time.perf_counter() - batch_started
+        PLAN_BATCH_SIZE.observe(len(ids))
+        PLAN_BATCH_DURATION.observe(batch_sec)
+        log_event(logger, 'send task_run_execution', job_id=job_id,
+                  count=len(ids), duration_ms=round(batch_sec * 1000, 1))
+    log_event(logger, 'job planned', job_id=job_id, count=dispatched,
+              duration_ms=round((time.perf_counter() - started) * 1000, 1))
@@ -0,0 +1,149 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, func
+
+from worker.celery_app import celery_app
+from worker.tasks.plan_job import claim_batch, dispatch
+from db.db import Session
+from db.models import Job, Execution, PlanShard
+from log.utils import log_event
+from metrics import PLAN_BATCH_DURATION, PLAN_BATCH_SIZE
+
+from config import TASK_PLAN_SHARD, PLAN_BATCH, PLAN_SHARD_LEASE_SEC
+
+logger = logging.getLogger('worker plan_shard')
+
+
+def _lease() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=PLAN_SHARD_LEASE_SEC)
+
+
+def _claim_shard(shard_id: str):
+    # NEW, or RUNNING under a planner that stopped renewing its lease
+    now = datetime.now(timezone.utc)
+    with Session.begin() as session:
+        return session.execute(
+            update(PlanShard)
+            .where(
+                PlanShard.uid == shard_id,
+                (PlanShard.status == PlanShard.Status.NEW)
+                | ((PlanShard.status == PlanShard.Status.RUNNING) & (PlanShard.lease_expires_at < now)),
+            )
+            .values(
+                status=PlanShard.Status.RUNNING,
+                attempts=PlanShard.attempts + 1,
+                started_at=func.coalesce(PlanShard.started_at, now),
+                lease_expires_at=_lease(),
+            )
+            .returning(PlanShard.job_id, PlanShard.uid_from, PlanShard.uid_to, PlanShard.last_uid, PlanShard.attempts)
+        ).one_or_none()
+
+
+def _hold(session, shard_id: str, attempt: int) -> bool:
+    # locks the shard row until the transaction ends if this attempt still owns it: a takeover's claim waits
+    # for the batch in flight and resumes from the cursor it recorded, and a planner that lost its lease stops
+    return session.execute(
+        select(PlanShard.uid)
+        .where(
+            PlanShard.uid == shard_id,
+            PlanShard.status == PlanShard.Status.RUNNING,
+            PlanShard.attempts == attempt,
+        )
+        .with_for_update()
+    ).first() is not None
+
+
+def _undispatched(session, job_id, uid_from, last_uid) -> list:
+    # queued up to the recorded cursor by a previous attempt that died, or lost its lease, before the
+    # publish was recorded; the other planner may still publish some of them, and run_execution claims
+    # an execution with a conditional update, so the second message finds it taken and does nothing
+    stmt = select(Execution.uid).where(
+        Execution.job_id == job_id,
+        Execution.status == Execution.Status.QUEUED,
+        Execution.dispatched_at.is_(None),
+        Execution.next_attempt_at.is_(None),
+        Execution.uid <= last_uid,
+    )
+    if uid_from is not None:
+        stmt = stmt.where(Execution.uid >= uid_from)
+    return session.execute(stmt).scalars().all()
+
+
+def _taken_over(job_id: str, shard_id: str, attempt: int, dispatched: int) -> None:
+    log_event(logger, 'plan shard taken over', job_id=job_id, shard_id=shard_id, attempt=attempt, count=dispatched)
+
+
+@celery_app.task(name=TASK_PLAN_SHARD, acks_late=True, reject_on_worker_lost=True)
+def plan_shard(shard_id: str, batch_size: int = PLAN_BATCH) -> None:
+    claimed = _claim_shard(shard_id)
+    if claimed is None:
+        return
+    job_id, uid_from, uid_to, last_uid, attempts = claimed
+    job_id = str(job_id)
+
+    dispatched = 0
+    if attempts > 1 and last_uid is not None:
+        with Session.begin() as session:
+            if not _hold(session, shard_id, attempts):
+                _taken_over(job_id, shard_id, attempts, dispatched)
+                return
+            ids = _undispatched(session, job_id, uid_from, last_uid)
+        if ids:
+            dispatch(job_id, ids)
+        log_event(logger, 'plan shard resumed', job_id=job_id, shard_id=shard_id, attempt=attempts,
+                  redispatched=len(ids))
+
+    while True:
+        batch_started = time.perf_counter()
+        with Session.begin() as session:
+            if not _hold(session, shard_id, attempts):
+                _taken_over(job_id, shard_id, attempts, dispatched)
+                return
+            ids = claim_batch(session, job_id, batch_size, uid_from, uid_to, after=last_uid)
+            if ids:
+                # the cursor moves with the claim, so a takeover never walks this range again
+                last_uid = max(ids)
+                session.execute(
+                    update(PlanShard)
+                    .where(PlanShard.uid == shard_id)
+                    .values(last_uid=last_uid, dispatched=PlanShard.dispatched + len(ids), lease_expires_at=_lease())
+                )
+
+        if not ids:
+            break
+
+        dispatch(job_id, ids)
+        dispatched += len(ids)
+        batch_sec = time.perf_counter() - batch_started
+        PLAN_BATCH_SIZE.observe(len(ids))
+        PLAN_BATCH_DURATION.observe(batch_sec)
+
+    now = datetime.now(timezone.utc)
+    with Session.begin() as session:
+        # the job row lock serialises the last shards to finish, so exactly one sees none left
+        session.execute(select(Job.uid).where(Job.uid == job_id).with_for_update())
+        done = session.execute(
+            update(PlanShard)
+            .where(
+                PlanShard.uid == shard_id,
+                PlanShard.status == PlanShard.Status.RUNNING,
+                PlanShard.attempts == attempts,
+            )
+            .values(status=PlanShard.Status.DONE, finished_at=now, lease_expires_at=None)
+        ).rowcount
+        if not done:
+            _taken_over(job_id, shard_id, attempts, dispatched)
+            return
+        remaining, planning_started = session.execute(
+            select(
+                func.count(PlanShard.uid).filter(PlanShard.status != PlanShard.Status.DONE),
+                func.min(PlanShard.created_at),
+            ).where(PlanShard.job_id == job_id)
+        ).one()
+
+    log_event(logger, 'plan shard done', job_id=job_id, shard_id=shard_id, count=dispatched)
+    if remaining == 0:
+        log_event(logger, 'job planned', job_id=job_id,
+                  duration_ms=round((now - planning_started).total_seconds() * 1000, 1))
@@ -4,11 +4,12 @@ from datetime import timezone, datetime
 from worker.celery_app import celery_app
 from config import TASK_PUBLISH_OUTBOX, TASK_PLAN_JOB
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 
-from db.models import Outbox
+from db.models import Outbox, Job
 from db.db import Session
 from log.utils import log_event
+from metrics import BROKER_PUBLISHES
 
 logger = logging.getLogger('publish_outbox')
 
@@ -37,11 +38,20 @@ def publish_outbox(batch_size: int = 200) -> None:
 
                 event.status = Outbox.Status.SENT
                 event.sent_at = datetime.now(timezone.utc)
-                log_event(logger, 'outbox event sent', job_id=job_id)
             except Exception as e:
                 event.attempts += 1
                 event.status = Outbox.Status.FAILED if event.attempts >= 10 else Outbox.Status.NEW
 
+        if job_ids:
+            session.execute(
+                update(Job)
+                .where(Job.uid.in_(job_ids), Job.plan_published_at.is_(None))
+                .values(plan_published_at=datetime.now(timezone.utc))
+            )
+
     for jid in list(dict.fromkeys(job_ids)):
         celery_app.send_task(TASK_PLAN_JOB, args=[jid])
-        log_event(logger, 'outbox event send task plan job', job_id=job_id)
+        BROKER_PUBLISHES.labels(TASK_PLAN_JOB).inc()
+        log_event(logger, 'outbox event send task plan job', job_id=jid)
+    if events:
+        log_event(logger, 'outbox events sent', count=len(events))
@@ -0,0 +1,98 @@
+import logging
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import select, update, insert, or_, and_
+
+from worker.celery_app import celery_app
+from db.db import Session
+from db.models import Execution, ExecutionLogs, PlanShard
+from log.utils import log_event
+from metrics import EXECUTION_RETRIES, EXECUTION_FINISHED, BROKER_PUBLISHES
+import job_cache
+import job_events
+
+from config import TASK_REAP_EXECUTIONS, MAX_RETRIES, REAPER_BATCH
+from config import TASK_PLAN_SHARD, PLAN_SHARD_LEASE_SEC
+
+logger = logging.getLogger('worker reap_executions')
+
+
+def _reap_plan_shards(now: datetime) -> None:
+    # a shard whose planner died, or whose plan_shard message was never published, is made claimable again.
+    # The lease is pushed forward with the re-send, so a backlogged queue does not collect duplicates;
+    # two planners on one shard are harmless anyway, executions only move NEW -> QUEUED under row locks
+    lease = timedelta(seconds=PLAN_SHARD_LEASE_SEC)
+    with Session.begin() as session:
+        shard_ids = session.execute(
+            update(PlanShard)
+            .where(or_(
+                and_(PlanShard.status == PlanShard.Status.RUNNING, PlanShard.lease_expires_at < now),
+                and_(PlanShard.status == PlanShard.Status.NEW,
+                     PlanShard.created_at < now - lease,
+                     or_(PlanShard.lease_expires_at.is_(None), PlanShard.lease_expires_at < now)),
+            ))
+            .values(status=PlanShard.Status.NEW, lease_expires_at=now + lease)
+            .returning(PlanShard.uid)
+        ).scalars().all()
+
+    for shard_id in shard_ids:
+        celery_app.send_task(TASK_PLAN_SHARD, args=[str(shard_id)])
+    if shard_ids:
+        BROKER_PUBLISHES.labels(TASK_PLAN_SHARD).inc(len(shard_ids))
+        log_event(logger, 'plan shards resent', count=len(shard_ids))
+
+
+@celery_app.task(name=TASK_REAP_EXECUTIONS)
+def reap_executions(batch_size: int = REAPER_BATCH) -> None:
+    now = datetime.now(timezone.utc)
+    _reap_plan_shards(now)
+    with Session.begin() as session:
+        rows = session.execute(
+            select(Execution.uid, Execution.retries, Execution.job_id)
+            .where(
+                Execution.status == Execution.Status.RUNNING,
+                Execution.lease_expires_at < now,
+            )
+            .with_for_update(skip_locked=True)
+            .limit(batch_size)
+        ).all()
+
+        if not rows:
+            return
+
+        requeue = [uid for uid, retries, _ in rows if retries < MAX_RETRIES]
+        fail = [uid for uid, retries, _ in rows if retries >= MAX_RETRIES]
+
+        if requeue:
+            # due immediately: schedule_retries picks them up on its next tick
+            session.execute(
+                update(Execution)
+                .where(Execution.uid.in_(requeue), Execution.status == Execution.Status.RUNNING)
+                .values(
+                    status=Execution.Status.QUEUED,
+                    retries=Execution.retries + 1,
+                    next_attempt_at=now,
+                    lease_expires_at=None,
+                )
+            )
+        if fail:
+            session.execute(
+                update(Execution)
+                .where(Execution.uid.in_(fail), Execution.status == Execution.Status.RUNNING)
+                .values(status=Execution.Status.FAILED, finished_at=now, lease_expires_at=None)
+            )
+
+        session.execute(
+            insert(ExecutionLogs),
+            [{"execution_id": uid, "line": "lease expired, worker lost"} for uid, _, _ in rows],
+        )
+
+    job_cache.bump(*{str(job_id) for _, _, job_id in rows})
+    requeued = set(requeue)
+    for uid, _, job_id in rows:
+        status = Execution.Status.QUEUED if uid in requeued else Execution.Status.FAILED
+        job_events.publish(str(job_id), str(uid), status.value, "lease expired, worker lost")
+
+    EXECUTION_RETRIES.labels("lease_expired").inc(len(requeue))
+    EXECUTION_FINISHED.labels(Execution.Status.FAILED.value).inc(len(fail))
+    log_event(logger, 'orphaned executions reaped', count=len(rows))
@@ -1,95 +1,466 @@
+import logging
 import random
+import threading
 import time
 import zlib
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
 
-from sqlalchemy import select, update, text, insert
+from sqlalchemy import select, update, text, insert, func
 
 from worker.celery_app import celery_app
-from db.db import Session
+from db.db import Session, lock_engine
 from db.models import Execution, ExecutionLogs, Job, HostCommandBlock
 
 from config import TASK_RUN_EXECUTION, MAX_BACKOFF, MAX_RETRIES, BASE_BACKOFF
+from config import EXEC_LEASE_SEC, EXEC_HEARTBEAT_SEC, CIRCUIT_OPEN_POLICY, CIRCUIT_DEFER_MAX_SEC
+from config import AGENT_OUTPUT_LINES
+from config import COALESCE_COMMANDS, COALESCE_POLL_SEC
+from config import JOB_CANCEL_POLL_SEC
+from metrics import AGENT_CALL_DURATION, HOST_LOCK_WAIT, EXECUTION_RETRIES, EXECUTION_FINISHED, CIRCUIT_EVENTS
+from metrics import COALESCE_LOOKUPS
+from log.utils import log_event
+import agent
+import coalesce
+import host_health
+import job_cache
+import job_cancel
+import job_events
+import log_chunks
+import profiling
+
+logger = logging.getLogger('worker run_execution')
+
+AGENT = agent.AgentModel()
+
+
+def backoff_seconds(retries_done: int, base: float = BASE_BACKOFF, cap: float = MAX_BACKOFF,
+                    rng: random.Random = random) -> float:
+    return min(cap, base * (2 ** retries_done)) + rng.uniform(0, 1.0)
+
+
+def _call_agent(host_id: str, command: tuple[Job.CommandType, dict], cancelled: threading.Event,
+                probe: bool = False) -> dict:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with profiling.phase("agent"):
+            result = _simulate_agent_call(host_id, command, cancelled)
+        outcome = "success"
+        return result
+    except TimeoutError:
+        outcome = "timeout"
+        raise
+    except job_cancel.JobCancelled:
+        outcome = "cancelled"
+        raise
+    finally:
+        AGENT_CALL_DURATION.labels(outcome).observe(time.perf_counter() - started)
+        # an interrupted call says nothing about the host; a half-open probe gives its slot back instead
+        if outcome != "cancelled":
+            _record_host_outcome(host_id, outcome)
+        elif probe:
+            _release_probe(host_id)
+
+
+def _simulate_agent_call(host_id: str, command: tuple[Job.CommandType, dict], cancelled: threading.Event) -> dict:
+    # a real agent is sent the command type and its payload; the simulation echoes the type
+    command_type, _payload = command
+    outcome, seconds = AGENT.outcome(host_id)
+    if cancelled.wait(seconds):
+        raise job_cancel.JobCancelled("job cancelled")
+    if outcome == agent.TIMEOUT:
+        raise TimeoutError("agent timeout")
+    if outcome == agent.ERROR:
+        raise RuntimeError("agent error")
+    stdout = "\n".join(f"[{i + 1}/{AGENT_OUTPUT_LINES}] {command_type.value} ok" for i in range(AGENT_OUTPUT_LINES))
+    return {"exit_code": 0, "stdout": stdout, "stderr": ""}
 
 
-def _backoff_seconds(retries_done: int) -> float:
-    return min(MAX_BACKOFF, BASE_BACKOFF * (2 ** retries_done)) + random.uniform(0, 1.0)
+def _result_line(result: dict) -> str:
+    # the output itself goes to execution_log_chunks, the event line only summarises the call
+    line = f"exit_code={result['exit_code']}"
+    if result.get("stderr"):
+        line += f" stderr={result['stderr']!r}"
+    return line
 
 
-def _simulate_agent_call() -> dict:
-    p = random.random()
-    if p > 0.5:
-        time.sleep(0.5)
-        raise TimeoutError("agent timeout")
-    if p < 0.15:
-        raise RuntimeError("agent error")
-    time.sleep(random.uniform(0.1, 1.5))
-    return {"exit_code": 0, "stdout": "ok", "stderr": ""}
+class _Fence(NamedTuple):
+    """The state this task read the execution in (QUEUED) or claimed it in (RUNNING).
+
+    Every write of the task matches on it, so after a reaper takeover, a cancel or a duplicate message
+    that got there first the stale task's update matches no row and is dropped.
+    """
+    status: Execution.Status
+    attempts: int | None = None
+    retries: int | None = None
+
+    def where(self, execution_id: str) -> tuple:
+        clauses = (Execution.uid == execution_id, Execution.status == self.status)
+        if self.status == Execution.Status.QUEUED:
+            # a parked retry or a deferral is schedule_retries' to dispatch
+            clauses += (Execution.next_attempt_at.is_(None),)
+        if self.attempts is not None:
+            clauses += (Execution.attempts == self.attempts,)
+        if self.retries is not None:
+            clauses += (Execution.retries == self.retries,)
+        return clauses
+
+
+def _steps(command_type: Job.CommandType, payload: dict, steps: list[dict] | None) -> list[tuple[Job.CommandType, dict]]:
+    # a plain job is a sequence of one
+    if not steps:
+        return [(command_type, payload)]
+    return [(Job.CommandType(s["command_type"]), s.get("payload") or {}) for s in steps]
+
+
+def _step_line(steps: list, step: int, line: str) -> str:
+    if len(steps) <= 1:
+        return line
+    return f"step {step + 1}/{len(steps)} {steps[step][0].value}: {line}"
+
+
+def _result_dropped(execution_id: str, job_id, fence: _Fence) -> None:
+    # taken over (lease reaped) while the call ran; the row is someone else's now
+    log_event(logger, 'result dropped, execution taken over', execution_id=execution_id,
+              job_id=str(job_id), attempt=fence.attempts)
+
+
+def _blocked(session, host_id, command_type: Job.CommandType) -> bool:
+    return session.execute(
+        select(HostCommandBlock.uid).where(
+            HostCommandBlock.host_id == host_id,
+            HostCommandBlock.command_type == command_type,
+        )
+    ).first() is not None
+
+
+def _record_step(session, execution_id: str, fence: _Fence, step: int, result: dict, line: str) -> bool:
+    # committed before the next step starts, so a retry or a takeover after a crash resumes after it;
+    # False if the execution was taken over, the sequence must not go on then
+    updated = session.execute(
+        update(Execution)
+        .where(*fence.where(execution_id))
+        .values(step=step)
+    ).rowcount
+    if updated == 0:
+        session.rollback()
+        return False
+    log_chunks.append(session, execution_id, result["stdout"].splitlines())
+    session.execute(insert(ExecutionLogs).values(execution_id=execution_id, line=line))
+    session.commit()
+    return True
+
+
+def _admit_host(host_id: str) -> host_health.Admission:
+    # the breaker is an optimisation: if Redis is unavailable executions run as if the circuit was closed
+    try:
+        admission = host_health.admit(host_id)
+    except Exception as e:
+        log_event(logger, 'host health unavailable', host_id=host_id, error_type=type(e).__name__, error_msg=str(e))
+        return host_health.Admission(True, host_health.CLOSED)
+    if admission.probe:
+        CIRCUIT_EVENTS.labels("probe").inc()
+    return admission
+
+
+def _record_host_outcome(host_id: str, outcome: str) -> None:
+    try:
+        opened = host_health.record(host_id, outcome)
+    except Exception as e:
+        log_event(logger, 'host health unavailable', host_id=host_id, error_type=type(e).__name__, error_msg=str(e))
+        return
+    if opened:
+        CIRCUIT_EVENTS.labels("opened").inc()
+        log_event(logger, 'host circuit opened', host_id=host_id)
+
+
+def _release_probe(host_id: str) -> None:
+    try:
+        host_health.release_probe(host_id)
+    except Exception:
+        pass
+
+
+def _coalesce_lookup(key: str, execution_id: str) -> coalesce.Lookup:
+    try:
+        found = coalesce.lookup(key, execution_id)
+    except Exception as e:
+        log_event(logger, 'coalesce unavailable', execution_id=execution_id,
+                  error_type=type(e).__name__, error_msg=str(e))
+        return coalesce.Lookup(coalesce.MISS)
+    COALESCE_LOOKUPS.labels(found.status).inc()
+    return found
+
+
+def _coalesce_claim(key: str, execution_id: str) -> bool:
+    try:
+        return coalesce.claim(key, execution_id)
+    except Exception:
+        return False
+
+
+def _coalesce_publish(key: str, execution_id: str, result: dict) -> None:
+    try:
+        coalesce.publish(key, execution_id, result)
+    except Exception as e:
+        log_event(logger, 'coalesce unavailable', execution_id=execution_id,
+                  error_type=type(e).__name__, error_msg=str(e))
+
+
+def _coalesce_release(key: str, execution_id: str) -> None:
+    try:
+        coalesce.release(key, execution_id)
+    except Exception:
+        pass
+
+
+def _job_changed(job_id, execution_id: str, status: Execution.Status, line: str | None = None) -> None:
+    # moves the job's ETag forward and pushes the transition to /jobs/{job_id}/events watchers
+    if job_id is None:
+        return
+    job_cache.bump(str(job_id))
+    job_events.publish(str(job_id), execution_id, status.value, line)
 
 
 def _host_lock_key(host_id: str) -> int:
     return zlib.crc32(host_id.encode("utf-8"))
 
 
-def _try_lock_host(session, host_id: str) -> bool:
-    return session.execute(
+def _try_lock_host(conn, host_id: str) -> bool:
+    started = time.perf_counter()
+    acquired = conn.execute(
         text("SELECT pg_try_advisory_lock(:k)"),
         {"k": _host_lock_key(host_id)},
     ).scalar_one()
+    HOST_LOCK_WAIT.labels(str(acquired).lower()).observe(time.perf_counter() - started)
+    return acquired
 
 
-def _unlock_host(session, host_id: str) -> None:
-    session.execute(
+def _unlock_host(conn, host_id: str) -> None:
+    conn.execute(
         text("SELECT pg_advisory_unlock(:k)"),
         {"k": _host_lock_key(host_id)},
     )
 
 
-def _retry_or_finish(task, execution_id: str, err: str, is_timeout: bool) -> None:
-    retries_done = task.request.retries
+class _LeaseHeartbeat:
+    """Extends `lease_expires_at` of a RUNNING execution while the agent call is in flight.
+
+    If the worker dies the lease stops being renewed and reap_executions requeues the execution.
+    Between renewals it looks at the job's cancellation flag every JOB_CANCEL_POLL_SEC and sets
+    `cancelled`, which interrupts the call.
+    """
+
+    def __init__(self, execution_id: str, job_id, fence: _Fence):
+        self.execution_id = execution_id
+        self.job_id = str(job_id)
+        self.fence = fence
+        self.cancelled = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{execution_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        renewed = time.monotonic()
+        while not self._stop.wait(JOB_CANCEL_POLL_SEC):
+            if not self.cancelled.is_set() and job_cancel.is_cancelled(self.job_id):
+                self.cancelled.set()
+            if time.monotonic() - renewed < EXEC_HEARTBEAT_SEC:
+                continue
+            renewed = time.monotonic()
+            try:
+                with Session.begin() as session:
+                    session.execute(
+                        update(Execution)
+                        .where(*self.fence.where(self.execution_id))
+                        .values(lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=EXEC_LEASE_SEC))
+                    )
+            except Exception as e:
+                log_event(logger, 'lease renew failed', execution_id=self.execution_id,
+                          error_type=type(e).__name__, error_msg=str(e))
+
+
+def _retry_or_finish(execution_id: str, job_id, fence: _Fence, retries_done: int, err: str, is_timeout: bool,
+                     agent_timing: dict, reason: str | None = None) -> None:
+    if job_id is not None and job_cancel.is_cancelled(str(job_id)):
+        _finish_cancelled(execution_id, job_id, fence, agent_timing, f'{err}; job cancelled')
+        return
+
     if retries_done < MAX_RETRIES:
+        # the retry is parked in the executions table and dispatched by schedule_retries when due,
+        # so no worker holds a delayed (ETA) message in memory
+        delay = backoff_seconds(retries_done)
         with Session.begin() as session:
-            session.execute(
-                update(Execution).where(Execution.uid == execution_id)
+            job_id = session.execute(
+                update(Execution).where(*fence.where(execution_id))
                 .values(
-                    status=Execution.Status.QUEUED
+                    status=Execution.Status.QUEUED,
+                    retries=Execution.retries + 1,
+                    next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
+                    backoff_seconds=Execution.backoff_seconds + delay,
+                    lease_expires_at=None,
+                    **agent_timing,
                 )
-            )
+                .returning(Execution.job_id)
+            ).scalar_one_or_none()
+            if job_id is None:
+                return
 
             session.execute(
                 insert(ExecutionLogs).values(execution_id=execution_id, line=err)
             )
-        raise task.retry(countdown=_backoff_seconds(retries_done), exc=RuntimeError(err))
+        _job_changed(job_id, execution_id, Execution.Status.QUEUED, err)
+        EXECUTION_RETRIES.labels(reason or ("timeout" if is_timeout else "error")).inc()
+        return
 
     final_status = Execution.Status.TIMEOUT if is_timeout else Execution.Status.FAILED
     with Session.begin() as session:
-        session.execute(
+        job_id = session.execute(
             update(Execution)
-            .where(Execution.uid == execution_id)
+            .where(*fence.where(execution_id))
             .values(
                 status=final_status,
                 finished_at=datetime.now(timezone.utc),
+                lease_expires_at=None,
+                **agent_timing,
             )
-        )
+            .returning(Execution.job_id)
+        ).scalar_one_or_none()
+        if job_id is None:
+            return
 
         session.execute(
             insert(ExecutionLogs).values(execution_id=execution_id, line=err)
         )
+    _job_changed(job_id, execution_id, final_status, err)
+    EXECUTION_FINISHED.labels(final_status.value).inc()
+
+
+def _finish_cancelled(execution_id: str, job_id, fence: _Fence, agent_timing: dict | None = None,
+                      line: str = 'job cancelled') -> None:
+    with Session.begin() as session:
+        updated = session.execute(
+            update(Execution)
+            .where(*fence.where(execution_id))
+            .values(status=Execution.Status.CANCELLED, finished_at=datetime.now(timezone.utc),
+                    next_attempt_at=None, lease_expires_at=None, **(agent_timing or {}))
+        ).rowcount
+        if updated == 0:
+            return
+        session.execute(
+            insert(ExecutionLogs).values(execution_id=execution_id, line=line)
+        )
+    log_event(logger, 'cancelled', execution_id=execution_id, job_id=str(job_id))
+    _job_changed(job_id, execution_id, Execution.Status.CANCELLED, line)
+    EXECUTION_FINISHED.labels(Execution.Status.CANCELLED.value).inc()
+
+
+def _reject_open_circuit(execution_id: str, fence: _Fence, admission: host_health.Admission,
+                         queued_at: datetime | None) -> None:
+    CIRCUIT_EVENTS.labels("rejected").inc()
+    now = datetime.now(timezone.utc)
+    waited = (now - queued_at).total_seconds() if queued_at is not None else 0.0
+    # a host whose probes keep failing would otherwise hold the execution queued forever
+    if CIRCUIT_OPEN_POLICY == "fail" or waited >= CIRCUIT_DEFER_MAX_SEC:
+        line = 'host circuit open' if CIRCUIT_OPEN_POLICY == "fail" else \
+            f'host circuit open, still deferred after {waited:.0f}s'
+        with Session.begin() as session:
+            job_id = session.execute(
+                update(Execution)
+                .where(*fence.where(execution_id))
+                .values(status=Execution.Status.FAILED, finished_at=now)
+                .returning(Execution.job_id)
+            ).scalar_one_or_none()
+            if job_id is None:
+                return
+            session.execute(
+                insert(ExecutionLogs).values(execution_id=execution_id, line=line)
+            )
+        _job_changed(job_id, execution_id, Execution.Status.FAILED, line)
+        EXECUTION_FINISHED.labels(Execution.Status.FAILED.value).inc()
+        return
+
+    # deferring does not consume a retry: the execution never reached the agent.
+    # schedule_retries dispatches it again once the circuit is due to half-open
+    delay = admission.retry_after + random.uniform(0, 1.0)
+    with Session.begin() as session:
+        updated = session.execute(
+            update(Execution)
+            .where(*fence.where(execution_id))
+            .values(next_attempt_at=now + timedelta(seconds=delay))
+        ).rowcount
+        if updated == 0:
+            return
+        session.execute(
+            insert(ExecutionLogs).values(execution_id=execution_id, line='host circuit open, deferred')
+        )
+
+
+def _finish_coalesced(execution_id: str, job_id, fence: _Fence, found: coalesce.Lookup) -> None:
+    now = datetime.now(timezone.utc)
+    line = f'coalesced with execution {found.execution_id}: {_result_line(found.result)}'
+    with Session.begin() as session:
+        updated = session.execute(
+            update(Execution)
+            .where(*fence.where(execution_id))
+            .values(status=Execution.Status.SUCCESS, started_at=now, finished_at=now)
+        ).rowcount
+        if updated == 0:
+            return
+
+        session.execute(
+            update(Job)
+            .where(Job.uid == job_id, Job.status == Job.Status.QUEUED)
+            .values(status=Job.Status.RUNNING)
+        )
+        session.execute(
+            insert(ExecutionLogs).values(execution_id=execution_id, line=line)
+        )
+    _job_changed(job_id, execution_id, Execution.Status.SUCCESS, line)
+    EXECUTION_FINISHED.labels(Execution.Status.SUCCESS.value).inc()
+
+
+def _wait_for_inflight(execution_id: str, fence: _Fence) -> None:
+    # the same call is already running on the host; look again shortly instead of queueing on the host lock
+    with Session.begin() as session:
+        session.execute(
+            update(Execution)
+            .where(*fence.where(execution_id))
+            .values(next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=COALESCE_POLL_SEC))
+        )
 
 
 @celery_app.task(
     name=TASK_RUN_EXECUTION,
-    bind=True,
-    max_retries=MAX_RETRIES,
     acks_late=True,
     reject_on_worker_lost=True,
 )
-def run_execution(self, execution_id: str) -> None:
+def run_execution(execution_id: str) -> None:
     now = datetime.now(timezone.utc)
 
     session = Session()
     host_id_str: str | None = None
-    lock_taken = False
+    # advisory locks are per server session, so the lock lives on its own connection:
+    # the ORM session hands its connection back to the pool on every commit
+    lock_conn = None
+    agent_timing: dict = {}
+    retries_done = 0
+    probe = False
+    coalesce_key: str | None = None
+    coalesce_owner = False
+    steps: list[tuple[Job.CommandType, dict]] = []
+    step = 0
+    job_id = None
+    # narrowed to the attempts and retries read below, then to the claimed attempt
+    fence = _Fence(Execution.Status.QUEUED)
 
     try:
         exec_obj = session.execute(
@@ -111,59 +482,94 @@ def run_execution(self, execution_id: str) -> None:
         if exec_obj.status != Execution.Status.QUEUED:
             return
 
-        host_id_str = str(exec_obj.host_id)
+        # a retry that is not due yet; schedule_retries will dispatch it again
+        if exec_obj.next_attempt_at is not None:
+            return
 
-        job_cmd = session.execute(
-            select(Job.command_type).where(Job.uid == exec_obj.job_id)
-        ).scalar_one()
+        retries_done = exec_obj.retries
+        step = exec_obj.step
+        job_id = exec_obj.job_id
+        fence = _Fence(Execution.Status.QUEUED, exec_obj.attempts, exec_obj.retries)
 
-        blocked = session.execute(
-            select(HostCommandBlock.uid).where(
-                HostCommandBlock.host_id == exec_obj.host_id,
-                HostCommandBlock.command_type == job_cmd,
-            )
-        ).first()
+        # the API has already cancelled queued executions in Postgres; this catches those requeued since
+        # (a retry made due, a reaped lease) before any further work
+        if job_cancel.is_cancelled(str(job_id)):
+            session.rollback()
+            _finish_cancelled(execution_id, job_id, fence)
+            return
 
-        if blocked:
-            session.execute(
+        host_id_str = str(exec_obj.host_id)
+
+        job_cmd, job_payload, job_steps = session.execute(
+            select(Job.command_type, Job.payload, Job.steps).where(Job.uid == exec_obj.job_id)
+        ).one()
+        steps = _steps(job_cmd, job_payload, job_steps)
+
+        if _blocked(session, exec_obj.host_id, steps[step][0]):
+            line = _step_line(steps, step, 'blocked by host policy')
+            updated = session.execute(
                 update(Execution)
-                .where(Execution.uid == execution_id, Execution.status == Execution.Status.QUEUED)
+                .where(*fence.where(execution_id))
                 .values(status=Execution.Status.BLOCKED, finished_at=now)
-            )
+            ).rowcount
+            if updated == 0:
+                session.commit()
+                return
             session.execute(
                 insert(ExecutionLogs).values(
                     execution_id=execution_id,
-                    line='blocked by host policy'
+                    line=line
                 )
             )
 
             session.commit()
+            _job_changed(exec_obj.job_id, execution_id, Execution.Status.BLOCKED, line)
+            EXECUTION_FINISHED.labels(Execution.Status.BLOCKED.value).inc()
             return
 
-        if not _try_lock_host(session, host_id_str):
+        # a result can only be shared by a whole call, not by one step of a sequence
+        if len(steps) == 1 and job_cmd.value in COALESCE_COMMANDS:
+            coalesce_key = coalesce.key(host_id_str, job_cmd.value, job_payload)
+            found = _coalesce_lookup(coalesce_key, execution_id)
+            if found.status == coalesce.HIT:
+                session.rollback()
+                _finish_coalesced(execution_id, exec_obj.job_id, fence, found)
+                return
+            if found.status == coalesce.WAIT:
+                session.rollback()
+                _wait_for_inflight(execution_id, fence)
+                return
+
+        admission = _admit_host(host_id_str)
+        if not admission.allowed:
             session.rollback()
-            session.execute(
-                insert(ExecutionLogs).values(
-                    execution_id=execution_id,
-                    line='host locked'
-                )
-            )
-            session.commit()
-            raise self.retry(
-                countdown=_backoff_seconds(self.request.retries),
-                exc=RuntimeError("host locked"),
-            )
-        lock_taken = True
+            _reject_open_circuit(execution_id, fence, admission, exec_obj.queued_at or exec_obj.created_at)
+            return
+        probe = admission.probe
 
-        updated = session.execute(
-            update(Execution)
-            .where(Execution.uid == execution_id, Execution.status == Execution.Status.QUEUED)
-            .values(status=Execution.Status.RUNNING, started_at=now, attempts=Execution.attempts + 1)
-        ).rowcount
+        lock_conn = lock_engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        if not _try_lock_host(lock_conn, host_id_str):
+            lock_conn.close()
+            lock_conn = None
+            session.rollback()
+            _retry_or_finish(execution_id, job_id, fence, retries_done, 'host locked', is_timeout=False,
+                             agent_timing={}, reason="host_locked")
+            return
+        locked_at = datetime.now(timezone.utc)
 
-        if updated == 0:
+        attempts = session.execute(
+            update(Execution)
+            .where(*fence.where(execution_id))
+            .values(status=Execution.Status.RUNNING, started_at=now, lock_acquired_at=locked_at,
+                    attempts=func.coalesce(Execution.attempts, 0) + 1,
+                    lease_expires_at=locked_at + timedelta(seconds=EXEC_LEASE_SEC))
+            .returning(Execution.attempts)
+        ).scalar_one_or_none()
+
+        if attempts is None:
             session.commit()
             return
+        fence = _Fence(Execution.Status.RUNNING, attempts, retries_done)
 
         session.execute(
             update(Job)
@@ -171,37 +577,92 @@ def run_execution(self, execution_id: str) -> None:
             .values(status=Job.Status.RUNNING)
         )
         session.commit()
+        _job_changed(exec_obj.job_id, execution_id, Execution.Status.RUNNING)
+
+        if coalesce_key is not None:
+            coalesce_owner = _coalesce_claim(coalesce_key, execution_id)
+
+        # the steps run back to back under the host lock taken above; a failed step goes through
+        # _retry_or_finish like a single call, so the sequence stops there or is retried from that step
+        final_status = Execution.Status.SUCCESS
+        agent_timing["agent_started_at"] = datetime.now(timezone.utc)
+        try:
+            with _LeaseHeartbeat(execution_id, job_id, fence) as heartbeat:
+                while True:
+                    # the call settles the probe: it records an outcome or, cancelled, gives the slot back
+                    probing, probe = probe, False
+                    result = _call_agent(host_id_str, steps[step], heartbeat.cancelled, probing)
+                    line = _step_line(steps, step, _result_line(result))
+                    if step + 1 == len(steps):
+                        step += 1
+                        break
+                    if not _record_step(session, execution_id, fence, step + 1, result, line):
+                        _result_dropped(execution_id, job_id, fence)
+                        return
+                    step += 1
+                    _job_changed(exec_obj.job_id, execution_id, Execution.Status.RUNNING, line)
+                    if heartbeat.cancelled.is_set():
+                        raise job_cancel.JobCancelled("job cancelled")
+                    if _blocked(session, exec_obj.host_id, steps[step][0]):
+                        final_status = Execution.Status.BLOCKED
+                        line = _step_line(steps, step, 'blocked by host policy')
+                        result = None
+                        break
+        finally:
+            agent_timing["agent_finished_at"] = datetime.now(timezone.utc)
+        finished = agent_timing["agent_finished_at"]
 
-        result = _simulate_agent_call()
-        finished = datetime.now(timezone.utc)
-
-        session.execute(
+        updated = session.execute(
             update(Execution)
-            .where(Execution.uid == execution_id, Execution.status == Execution.Status.RUNNING)
-            .values(status=Execution.Status.SUCCESS, finished_at=finished)
-        )
+            .where(*fence.where(execution_id))
+            .values(status=final_status, step=step, finished_at=finished, lease_expires_at=None, **agent_timing)
+        ).rowcount
+        if updated == 0:
+            session.commit()
+            _result_dropped(execution_id, job_id, fence)
+            return
+        if result is not None:
+            log_chunks.append(session, execution_id, result["stdout"].splitlines())
         session.execute(
             insert(ExecutionLogs).values(
                 execution_id=execution_id,
-                line=str(result)
+                line=line
             )
         )
         session.commit()
+        _job_changed(exec_obj.job_id, execution_id, final_status, line)
+        EXECUTION_FINISHED.labels(final_status.value).inc()
+        if coalesce_owner:
+            _coalesce_publish(coalesce_key, execution_id, result)
+            coalesce_owner = False
         return
 
+    except job_cancel.JobCancelled as e:
+        session.rollback()
+        _finish_cancelled(execution_id, job_id, fence, agent_timing, _step_line(steps, step, str(e)))
+
     except TimeoutError as e:
         session.rollback()
-        _retry_or_finish(self, execution_id, str(e), is_timeout=True)
+        _retry_or_finish(execution_id, job_id, fence, retries_done, _step_line(steps, step, str(e)),
+                         is_timeout=True, agent_timing=agent_timing)
 
     except Exception as e:
         session.rollback()
-        _retry_or_finish(self, execution_id, str(e), is_timeout=False)
+        _retry_or_finish(execution_id, job_id, fence, retries_done, _step_line(steps, step, str(e)),
+                         is_timeout=False, agent_timing=agent_timing)
 
     finally:
-        if lock_taken and host_id_str is not None:
+        # admitted as the half-open probe but never got to the agent call: whatever stopped it, the next
+        # execution may probe instead of every one waiting out PROBE_TTL_SEC
+        if probe:
+            _release_probe(host_id_str)
+        if coalesce_owner:
+            _coalesce_release(coalesce_key, execution_id)
+        if lock_conn is not None:
             try:
-                _unlock_host(session, host_id_str)
-                session.commit()
-            except Exception as e:
-                session.rollback()
+                _unlock_host(lock_conn, host_id_str)
+                lock_conn.close()
+            except Exception:
+                # dropping the server session is the only other way to release the lock
+                lock_conn.invalidate()
         session.close()
@@ -0,0 +1,69 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+
+from worker.celery_app import celery_app
+from db.db import Session
+from db.models import Execution
+from log.utils import log_event
+from metrics import BROKER_PUBLISHES
+
+from config import TASK_SCHEDULE_RETRIES, TASK_RUN_EXECUTION, RETRY_SCHEDULER_BATCH, REDISPATCH_AFTER_SEC
+
+logger = logging.getLogger('worker schedule_retries')
+
+
+def _dispatch_batch(due, batch_size: int) -> list:
+    # the row leaves `due` in the same transaction that picks it, then the message is published; a publish
+    # lost after the commit leaves it QUEUED with dispatched_at set and nothing to run it, which
+    # the stale pass below catches
+    now = datetime.now(timezone.utc)
+    with Session.begin() as session:
+        ids = (
+            session.execute(
+                select(Execution.uid)
+                .where(Execution.status == Execution.Status.QUEUED, *due(now))
+                .order_by(Execution.next_attempt_at.asc(), Execution.dispatched_at.asc())
+                .with_for_update(skip_locked=True)
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if ids:
+            session.execute(
+                update(Execution)
+                .where(Execution.uid.in_(ids))
+                .values(next_attempt_at=None, dispatched_at=now)
+            )
+
+    for execution_id in ids:
+        celery_app.send_task(TASK_RUN_EXECUTION, args=[str(execution_id)])
+    BROKER_PUBLISHES.labels(TASK_RUN_EXECUTION).inc(len(ids))
+    return ids
+
+
+def _due_retries(now: datetime) -> tuple:
+    return Execution.next_attempt_at.is_not(None), Execution.next_attempt_at <= now
+
+
+def _stale_dispatches(now: datetime) -> tuple:
+    # run_execution drops a duplicate of a message that is still in the queue, so resending is safe
+    return (
+        Execution.next_attempt_at.is_(None),
+        Execution.dispatched_at < now - timedelta(seconds=REDISPATCH_AFTER_SEC),
+    )
+
+
+@celery_app.task(name=TASK_SCHEDULE_RETRIES)
+def schedule_retries(batch_size: int = RETRY_SCHEDULER_BATCH) -> None:
+    for due, event in ((_due_retries, 'retries dispatched'), (_stale_dispatches, 'stale dispatches resent')):
+        dispatched = 0
+        while True:
+            ids = _dispatch_batch(due, batch_size)
+            dispatched += len(ids)
+            if len(ids) < batch_size:
+                break
+        if dispatched:
+            log_event(logger, event, count=dispatched)